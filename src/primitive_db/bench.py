@@ -0,0 +1,465 @@
+import compileall
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime, timezone
+
+from prettytable import PrettyTable
+
+from src.primitive_db import vectorized
+from src.primitive_db.binary_format import read_table, write_table
+from src.primitive_db.constants import (
+    BENCH_INSERT_ROWS,
+    BENCH_POINT_QUERIES,
+    BENCH_REGRESSION_THRESHOLD,
+    BENCH_REPEAT,
+    BENCH_SEED,
+    METADATA_FILE,
+    PARALLEL_SCAN_MIN_ROWS,
+)
+from src.primitive_db.decorators import set_auto_confirm
+from src.primitive_db.engine import execute, query_cache
+from src.primitive_db.parallel import (
+    configure_parallel,
+    parallel_scan,
+    worker_count,
+)
+from src.primitive_db.parser import parse_where_clause
+from src.primitive_db.predicate import compile_predicate
+from src.primitive_db.session import Session
+from src.primitive_db.table import Table
+from src.primitive_db.utils import (
+    load_metadata,
+    load_table_data,
+    metadata_cache,
+    save_table_data,
+    table_cache,
+)
+
+# Файл результатов:
+# {"meta": {...}, "results": [{"rows": 1000, "format": "json",
+#   "operation": "scan", "column": "int", "ops": 1, "samples": [...],
+#   "median": 0.01, "min": 0.009}, ...]}.
+# Операция с ops > 1 - пачка из ops одинаковых команд, время указано
+# на всю пачку.
+
+BENCH_TABLE = 'bench'
+
+# Для каждого типа столбца - условие полного просмотра, которое не может
+# использовать индекс.
+SCAN_QUERIES = {
+    'int': 'num >= {high}',
+    'str': "name = 'name{middle}'",
+    'bool': 'flag = true',
+}
+
+# Условия для проверки параллельного просмотра: подряд идущие запросы
+# к одной версии таблицы обращаются к разным столбцам.
+SCAN_CHECK_QUERIES = (
+    *SCAN_QUERIES.values(),
+    "name = 'name{middle}' or num < {low}",
+    SCAN_QUERIES['int'],
+)
+
+PROJECT_ROOT = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+# Модули, которые загружаются только по требованию и не должны
+# попадать в запуск программы.
+LAZY_MODULES = (
+    'numpy',
+    'prettytable',
+    'prompt',
+    'asyncio',
+    'concurrent.futures',
+    'multiprocessing',
+    'cProfile',
+    'tempfile',
+)
+
+
+def _generate_rows(filepath, rows, rng):
+    with open(filepath, 'w', encoding='utf-8') as f:
+        for _ in range(rows):
+            record = {
+                'num': rng.randrange(rows * 10),
+                'name': f'name{rng.randrange(rows)}',
+                'flag': rng.random() < 0.5,
+            }
+            f.write(json.dumps(record) + '\n')
+
+
+@contextmanager
+def _quiet():
+    with redirect_stdout(io.StringIO()):
+        yield
+
+
+def _reset_caches():
+    # Каталог меняется между прогонами, а кэши привязаны к относительным путям.
+    table_cache.clear()
+    metadata_cache.clear()
+    query_cache.clear()
+
+
+def _measure(action, repeat, before=None):
+    samples = []
+    for attempt in range(repeat):
+        if before is not None:
+            before(attempt)
+        start = time.perf_counter()
+        with _quiet():
+            action(attempt)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _result(rows, table_format, operation, column, samples, ops=1):
+    return {
+        'rows': rows,
+        'format': table_format,
+        'operation': operation,
+        'column': column,
+        'ops': ops,
+        'samples': samples,
+        'median': statistics.median(samples),
+        'min': min(samples),
+    }
+
+
+def _run_statements(statements, batch=False):
+    session = Session(batch=batch)
+    try:
+        for statement in statements:
+            execute(statement, session)
+            session.statement_done()
+    finally:
+        session.close()
+
+
+def _child_env():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        filter(None, [PROJECT_ROOT, env.get('PYTHONPATH')])
+    )
+    return env
+
+
+def _startup():
+    subprocess.run(
+        [sys.executable, '-m', 'src.primitive_db.main', '-c', 'list_tables'],
+        env=_child_env(),
+        stdout=subprocess.DEVNULL,
+        check=True,
+    )
+
+
+def _import_times():
+    # Строки -X importtime: "import time: <своё, мкс> | <с вложенными> | <модуль>".
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import src.primitive_db.main'],
+        env=_child_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        fields = line.removeprefix('import time:').split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        times[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+    return times
+
+
+def check_startup(budget_ms, repeat=BENCH_REPEAT):
+    # Без байт-кода замер включал бы компиляцию модулей.
+    compileall.compile_dir(os.path.join(PROJECT_ROOT, 'src'), quiet=1)
+    runs = [_import_times() for _ in range(repeat)]
+    times = min(runs, key=lambda run: run['src.primitive_db.main'][1])
+    total_ms = times['src.primitive_db.main'][1] / 1000
+
+    output = PrettyTable()
+    output.field_names = ['Модуль', 'Своё время, мс', 'С вложенными, мс']
+    slowest = sorted(times.items(), key=lambda item: item[1][0], reverse=True)
+    for name, (own, cumulative) in slowest[:10]:
+        output.add_row([name, f'{own / 1000:.1f}', f'{cumulative / 1000:.1f}'])
+    print(output)
+    print(f'Импорт src.primitive_db.main: {total_ms:.1f} мс '
+          f'(бюджет {budget_ms} мс).')
+
+    loaded = [
+        name for name in LAZY_MODULES
+        if any(module == name or module.startswith(f'{name}.')
+               for module in times)
+    ]
+    if loaded:
+        print(f'Ошибка: При запуске загружаются модули: {", ".join(loaded)}.')
+    if total_ms > budget_ms:
+        print('Ошибка: Запуск превышает бюджет.')
+    return not loaded and total_ms <= budget_ms
+
+
+def _scan_check_tables(rows, tmpdir, rng):
+    columns = [('ID', 'int'), ('num', 'int'), ('name', 'str'), ('flag', 'bool')]
+    records = [
+        {
+            'ID': record_id,
+            'num': rng.randrange(rows * 10),
+            'name': f'name{rng.randrange(rows)}',
+            'flag': rng.random() < 0.5,
+        }
+        for record_id in range(1, rows + 1)
+    ]
+    memory = Table.from_records(BENCH_TABLE, columns, records)
+    yield 'память', memory
+
+    filepath = os.path.join(tmpdir, f'{BENCH_TABLE}.bin')
+    write_table(filepath, memory)
+    binary = read_table(filepath, BENCH_TABLE, columns)
+    yield 'binary', binary
+
+    # Часть столбцов остаётся в файле, часть и признак удаления - в памяти.
+    binary.update(0, {'name': 'changed'})
+    binary.delete(1)
+    yield 'binary после изменений', binary
+
+
+def check_parallel_scan(seed=BENCH_SEED):
+    # Параллельный просмотр сравнивается с последовательным на таблице
+    # в памяти и в формате binary, в том числе после изменений.
+    rows = PARALLEL_SCAN_MIN_ROWS
+    rng = random.Random(seed)
+    workers = worker_count()
+    configure_parallel(max(2, workers))
+    output = PrettyTable()
+    output.field_names = ['Таблица', 'Условие', 'Найдено', 'Результат']
+    failures = 0
+    try:
+        with tempfile.TemporaryDirectory(prefix='primitive-db-scan-') as tmpdir:
+            for label, table in _scan_check_tables(rows, tmpdir, rng):
+                for condition in SCAN_CHECK_QUERIES:
+                    where = condition.format(
+                        high=rows * 9, middle=rows // 2, low=rows // 10
+                    )
+                    where_clause = parse_where_clause(where)
+                    expected = list(compile_predicate(table, where_clause)(
+                        table.positions()
+                    ))
+                    try:
+                        positions = parallel_scan(table, where_clause)
+                        status = 'совпадает'
+                        if positions != expected:
+                            status = 'РАСХОЖДЕНИЕ'
+                    except Exception as e:
+                        status = f'ошибка {e!r}'
+                    failures += status != 'совпадает'
+                    output.add_row([label, where, len(expected), status])
+    finally:
+        configure_parallel(workers)
+    print(output)
+    if failures:
+        print(f'Ошибка: Параллельный просмотр расходится с последовательным: '
+              f'{failures}.')
+    return failures == 0
+
+
+def bench_size(rows, table_format, repeat, seed=BENCH_SEED):
+    # Таблица создаётся во временном каталоге заново для каждого размера
+    # и формата, поэтому прогоны не влияют друг на друга.
+    rng = random.Random(seed)
+    results = []
+    workdir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='primitive-db-bench-') as tmpdir:
+        os.chdir(tmpdir)
+        _reset_caches()
+        try:
+            source = os.path.join(tmpdir, 'rows.jsonl')
+            _generate_rows(source, rows, rng)
+            with _quiet():
+                _run_statements([
+                    f'create_table {BENCH_TABLE} num:int name:str flag:bool',
+                    f'set_format {BENCH_TABLE} {table_format}',
+                ])
+
+            def add(operation, column, samples, ops=1):
+                results.append(
+                    _result(rows, table_format, operation, column, samples, ops)
+                )
+
+            add('import', None, _measure(
+                lambda _: _run_statements(
+                    [f'import {BENCH_TABLE} {source}'], batch=True
+                ),
+                1,
+            ), rows)
+
+            inserts = min(BENCH_INSERT_ROWS, rows)
+            add('insert', None, _measure(
+                lambda _: _run_statements(
+                    f"insert into {BENCH_TABLE} values "
+                    f"({rng.randrange(rows * 10)}, 'inserted', true)"
+                    for _ in range(inserts)
+                ),
+                1,
+            ), inserts)
+
+            def clear_results(_):
+                query_cache.clear()
+
+            add('point_select', 'int', _measure(
+                lambda _: _run_statements(
+                    f'select from {BENCH_TABLE} where ID = {rng.randint(1, rows)}'
+                    for _ in range(BENCH_POINT_QUERIES)
+                ),
+                repeat,
+                clear_results,
+            ), BENCH_POINT_QUERIES)
+
+            for col_type, condition in SCAN_QUERIES.items():
+                where = condition.format(high=rows * 9, middle=rows // 2)
+                add('scan', col_type, _measure(
+                    lambda _, where=where: _run_statements(
+                        [f'select count(*) from {BENCH_TABLE} where {where}']
+                    ),
+                    repeat,
+                    clear_results,
+                ))
+
+            add('update', None, _measure(
+                lambda attempt: _run_statements([
+                    f"update {BENCH_TABLE} set name = 'updated{attempt}', "
+                    f'flag = false where num < {rows // 10}'
+                ]),
+                repeat,
+            ))
+
+            # Каждый повтор удаляет свой процент строк.
+            add('delete', None, _measure(
+                lambda attempt: _run_statements([
+                    f'delete from {BENCH_TABLE} where num between '
+                    f'{rows * (attempt + 1) // 10} '
+                    f'and {rows * (attempt + 2) // 10 - 1}'
+                ]),
+                repeat,
+            ))
+
+            metadata = load_metadata(METADATA_FILE)
+            table = load_table_data(BENCH_TABLE, metadata)
+            add('save', None, _measure(
+                lambda _: save_table_data(BENCH_TABLE, table, metadata),
+                repeat,
+            ))
+            add('load', None, _measure(
+                lambda _: load_table_data(BENCH_TABLE, metadata),
+                repeat,
+                lambda _: _reset_caches(),
+            ))
+            add('startup', None, _measure(lambda _: _startup(), repeat))
+        finally:
+            _reset_caches()
+            os.chdir(workdir)
+    return results
+
+
+def _metadata(sizes, formats, repeat):
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': numpy_version,
+        'vectorized': vectorized.is_enabled(),
+        'parallel_workers': worker_count(),
+        'sizes': sizes,
+        'formats': formats,
+        'repeat': repeat,
+        'seed': BENCH_SEED,
+    }
+
+
+def _result_key(result):
+    return result['rows'], result['format'], result['operation'], result['column']
+
+
+def print_results(results, baseline=None):
+    field_names = [
+        'Строк', 'Формат', 'Операция', 'Столбец', 'Медиана, с',
+        'На операцию, мкс',
+    ]
+    base = {}
+    if baseline is not None:
+        base = {_result_key(result): result for result in baseline['results']}
+        field_names.append('К базовому')
+
+    output = PrettyTable()
+    output.field_names = field_names
+    regressions = 0
+    for result in results:
+        row = [
+            result['rows'],
+            result['format'],
+            result['operation'],
+            result['column'] or '',
+            f'{result["median"]:.4f}',
+            f'{result["median"] / result["ops"] * 1e6:.1f}',
+        ]
+        if baseline is not None:
+            previous = base.get(_result_key(result))
+            if previous is None or not previous['median']:
+                row.append('')
+            else:
+                ratio = result['median'] / previous['median']
+                mark = ''
+                if ratio > 1 + BENCH_REGRESSION_THRESHOLD:
+                    mark = ' !'
+                    regressions += 1
+                row.append(f'{ratio:.2f}x{mark}')
+        output.add_row(row)
+    print(output)
+    return regressions
+
+
+def run_bench(sizes, formats, repeat, output_path, baseline_path=None):
+    set_auto_confirm(True)
+    baseline = None
+    if baseline_path:
+        try:
+            with open(baseline_path, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f'Ошибка: Не удалось прочитать "{baseline_path}": {e}')
+            return False
+
+    results = []
+    for rows in sizes:
+        for table_format in formats:
+            print(f'Строк: {rows}, формат: {table_format}...', flush=True)
+            results.extend(bench_size(rows, table_format, repeat))
+
+    report = {'meta': _metadata(sizes, formats, repeat), 'results': results}
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    regressions = print_results(results, baseline)
+    print(f'Результаты записаны в "{output_path}".')
+    if regressions:
+        print(
+            f'Медленнее базового прогона более чем на '
+            f'{BENCH_REGRESSION_THRESHOLD:.0%}: {regressions}.'
+        )
+    return regressions == 0
@@ -0,0 +1,173 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from src.primitive_db.table import Table
+
+MAGIC = b'PDBT'
+FORMAT_VERSION = 1
+TRAILER = struct.Struct('<Q4s')
+ALIGNMENT = 8
+
+
+def _pad(size):
+    return -size % ALIGNMENT
+
+
+def _int_block(store, positions):
+    if len(positions) == len(store):
+        values = store.values
+        if not isinstance(values, array):
+            return bytes(values)
+        return values.tobytes()
+    return array('q', (store.get(pos) for pos in positions)).tobytes()
+
+
+def _bool_block(store, positions):
+    if len(positions) == len(store):
+        return bytes(store.values)
+    return bytes(store.values[pos] for pos in positions)
+
+
+def _str_blocks(store, positions):
+    offsets = array('q', [0])
+    heap = bytearray()
+    buffer, starts, ends = store.buffer, store.starts, store.ends
+    for pos in positions:
+        heap += buffer[starts[pos]:ends[pos]]
+        offsets.append(len(heap))
+    return offsets.tobytes(), bytes(heap)
+
+
+def write_table(filepath, table, schema_version=0):
+    positions = table.positions()
+    tmp_path = f'{filepath}.tmp'
+    directory = {
+        'version': FORMAT_VERSION,
+        'byteorder': sys.byteorder,
+        'rows': len(positions),
+        'columns': [],
+    }
+    if schema_version:
+        directory['schema_version'] = schema_version
+
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(b'\0' * _pad(len(MAGIC)))
+
+        def write_block(data):
+            offset = f.tell()
+            f.write(data)
+            f.write(b'\0' * _pad(len(data)))
+            return [offset, len(data)]
+
+        for col_name, col_type in table.columns:
+            store = table.stores[col_name]
+            entry = {'name': col_name, 'type': col_type}
+            if col_type == 'int':
+                entry['data'] = write_block(_int_block(store, positions))
+            elif col_type == 'bool':
+                entry['data'] = write_block(_bool_block(store, positions))
+            else:
+                offsets, heap = _str_blocks(store, positions)
+                entry['offsets'] = write_block(offsets)
+                entry['data'] = write_block(heap)
+            directory['columns'].append(entry)
+
+        directory_offset = f.tell()
+        f.write(json.dumps(directory, ensure_ascii=False).encode('utf-8'))
+        f.write(TRAILER.pack(directory_offset, MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, filepath)
+
+
+def _read_directory(view):
+    if len(view) < len(MAGIC) + TRAILER.size or bytes(view[:len(MAGIC)]) != MAGIC:
+        raise ValueError('файл таблицы повреждён')
+
+    directory_offset, magic = TRAILER.unpack(view[-TRAILER.size:])
+    if magic != MAGIC:
+        raise ValueError('файл таблицы повреждён')
+
+    directory = json.loads(bytes(view[directory_offset:-TRAILER.size]))
+    if directory.get('byteorder') != sys.byteorder:
+        raise ValueError('файл таблицы записан с другим порядком байт')
+    return directory
+
+
+def _slice(view, block):
+    offset, size = block
+    return view[offset:offset + size]
+
+
+def file_id(stat):
+    return stat.st_dev, stat.st_ino
+
+
+def map_file(filepath):
+    # Представление файла через mmap и идентификатор файла;
+    # у пустого файла представления нет.
+    with open(filepath, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        if stat.st_size == 0:
+            return None, file_id(stat)
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mapped), file_id(stat)
+
+
+def map_column(store, view, entry):
+    if store.type_name == 'int':
+        store.values = _slice(view, entry['data']).cast('q')
+    elif store.type_name == 'bool':
+        store.values = _slice(view, entry['data'])
+    else:
+        offsets = _slice(view, entry['offsets']).cast('q')
+        store.starts = offsets[:-1]
+        store.ends = offsets[1:]
+        store.buffer = _slice(view, entry['data'])
+
+
+def read_table(filepath, name, columns, history=None):
+    table = Table(name, columns)
+    try:
+        view, source_id = map_file(filepath)
+    except FileNotFoundError:
+        return table
+    if view is None:
+        return table
+
+    # Столбцы ссылаются на страницы файла без копирования: читаются только
+    # те страницы, к которым обращается запрос.
+    directory = _read_directory(view)
+    count = directory['rows']
+    stored = {entry['name']: entry for entry in directory['columns']}
+    sources = None
+    if history is not None:
+        sources = history.sources(directory.get('schema_version', 0))
+
+    blocks = {}
+    for col_name, col_type in table.columns:
+        store = table.stores[col_name]
+        source, default = col_name, store.default
+        if sources is not None:
+            source, default = sources[col_name]
+        entry = stored.get(source)
+        if entry is None or entry['type'] != col_type:
+            if default == store.default:
+                store.fill(count)
+            else:
+                store.extend([default] * count)
+        else:
+            map_column(store, view, entry)
+            blocks[col_name] = entry
+
+    table.source = (os.path.abspath(filepath), source_id, blocks)
+    table.alive = bytearray(b'\x01') * count
+    table.live_count = count
+    return table
+
@@ -0,0 +1,128 @@
+import sys
+from collections import OrderedDict
+
+
+class TableCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, stamp):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] != stamp:
+            self.invalidate(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, stamp, value, size):
+        self.invalidate(key)
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (stamp, value, size)
+        self.total_bytes += size
+        self._evict()
+
+    def invalidate(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[2]
+
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+
+    def resize(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            _, (_, _, size) = self.entries.popitem(last=False)
+            self.total_bytes -= size
+
+
+def estimate_row_size(row):
+    size = sys.getsizeof(row)
+    for value in row.values():
+        size += sys.getsizeof(value)
+    return size
+
+
+def estimate_rows_size(rows):
+    return sys.getsizeof(rows) + sum(estimate_row_size(row) for row in rows)
+
+
+class ResultCache:
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.table_keys = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, table_name, key, version):
+        entry = self.entries.get((table_name, key))
+        if entry is None or entry[0] != version:
+            if entry is not None:
+                self._remove((table_name, key))
+            self.misses += 1
+            return None
+        self.entries.move_to_end((table_name, key))
+        self.hits += 1
+        return entry[1]
+
+    def put(self, table_name, key, version, value, size):
+        self._remove((table_name, key))
+        if size > self.max_bytes:
+            return
+        self.entries[(table_name, key)] = (version, value, size)
+        self.table_keys.setdefault(table_name, set()).add(key)
+        self.total_bytes += size
+
+        while self.entries and (
+            len(self.entries) > self.max_entries
+            or self.total_bytes > self.max_bytes
+        ):
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate_table(self, table_name):
+        for key in list(self.table_keys.get(table_name, ())):
+            self._remove((table_name, key))
+
+    def clear(self):
+        self.entries.clear()
+        self.table_keys.clear()
+        self.total_bytes = 0
+
+    def stats(self):
+        return {
+            'entries': len(self.entries),
+            'bytes': self.total_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def _remove(self, cache_key):
+        entry = self.entries.pop(cache_key, None)
+        if entry is None:
+            return
+        self.total_bytes -= entry[2]
+        table_name, key = cache_key
+        keys = self.table_keys.get(table_name)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.table_keys[table_name]
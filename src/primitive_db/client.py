@@ -0,0 +1,147 @@
+import json
+import queue
+import socket
+from contextlib import contextmanager
+
+from src.primitive_db.constants import (
+    CLIENT_PIPELINE_DEPTH,
+    CLIENT_POOL_SIZE,
+    SERVER_HOST,
+    SERVER_PORT,
+)
+
+
+class ServerError(Exception):
+    pass
+
+
+def _check(response):
+    if not response.get('ok'):
+        raise ServerError(response.get('error') or 'неизвестная ошибка')
+    return response
+
+
+class Connection:
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, socket_path=None):
+        if socket_path:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(socket_path)
+        else:
+            self.sock = socket.create_connection((host, port))
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb')
+        self.next_id = 1
+
+    def _send(self, commands):
+        ids = []
+        lines = []
+        for command in commands:
+            ids.append(self.next_id)
+            lines.append(json.dumps(
+                {'id': self.next_id, 'command': command}, ensure_ascii=False
+            ) + '\n')
+            self.next_id += 1
+        self.sock.sendall(''.join(lines).encode('utf-8'))
+
+        responses = []
+        for request_id in ids:
+            line = self.reader.readline()
+            if not line:
+                raise ConnectionError('сервер закрыл соединение')
+            response = json.loads(line)
+            if response.get('id') != request_id:
+                raise ConnectionError('ответ сервера не соответствует запросу')
+            responses.append(response)
+        return responses
+
+    def pipeline(self, commands):
+        # Запросы отправляются пачками без ожидания ответа на каждый;
+        # размер пачки ограничен, чтобы не переполнить буферы сокета.
+        commands = list(commands)
+        responses = []
+        for start in range(0, len(commands), CLIENT_PIPELINE_DEPTH):
+            responses.extend(
+                self._send(commands[start:start + CLIENT_PIPELINE_DEPTH])
+            )
+        return responses
+
+    def execute(self, command):
+        response = _check(self._send([command])[0])
+        if 'output' in response:
+            return response['output']
+        return response['columns'], response['rows']
+
+    def query(self, command):
+        response = _check(self._send([command])[0])
+        if 'rows' not in response:
+            raise ServerError('команда не вернула строк')
+        columns = response['columns']
+        return [dict(zip(columns, row)) for row in response['rows']]
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+class Client:
+    # Соединения переиспользуются: после запроса соединение возвращается
+    # в пул, и следующий вызов не тратит время на подключение.
+    def __init__(
+        self,
+        host=SERVER_HOST,
+        port=SERVER_PORT,
+        socket_path=None,
+        pool_size=CLIENT_POOL_SIZE,
+    ):
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+
+    @contextmanager
+    def connection(self):
+        # Транзакция (begin ... commit) должна выполняться в одном соединении.
+        try:
+            conn = self.pool.get_nowait()
+        except queue.Empty:
+            conn = Connection(self.host, self.port, self.socket_path)
+        try:
+            yield conn
+        except ServerError:
+            self._release(conn)
+            raise
+        except Exception:
+            conn.close()
+            raise
+        self._release(conn)
+
+    def _release(self, conn):
+        try:
+            self.pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def execute(self, command):
+        with self.connection() as conn:
+            return conn.execute(command)
+
+    def query(self, command):
+        with self.connection() as conn:
+            return conn.query(command)
+
+    def pipeline(self, commands):
+        with self.connection() as conn:
+            return conn.pipeline(commands)
+
+    def close(self):
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
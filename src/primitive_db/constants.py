@@ -1,4 +1,41 @@
 METADATA_FILE = 'db_meta.json'
 DATA_DIR = 'data'
+COMMIT_FILE = 'data/transaction.commit'
 VALID_TYPES = {'int', 'str', 'bool'}
-
+LOG_COMPACT_MIN_BYTES = 64 * 1024
+TABLE_FORMATS = ('json', 'binary')
+DEFAULT_TABLE_FORMAT = 'json'
+TABLE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+RESULT_CACHE_MAX_ENTRIES = 256
+RESULT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+IMPORT_BATCH_SIZE = 10000
+SCAN_CHUNK_SIZE = 4096
+DISPLAY_CHUNK_SIZE = 100
+JOIN_SPILL_ROWS = 500000
+BATCH_COMMIT_EVERY = 1000
+BATCH_MAX_PENDING = 100000
+SNAPSHOT_READ_ATTEMPTS = 3
+ID_RESERVE_BLOCK = 1000
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 5555
+SERVER_MAX_REQUEST_BYTES = 64 * 1024 * 1024
+CLIENT_POOL_SIZE = 4
+CLIENT_PIPELINE_DEPTH = 256
+PARALLEL_SCAN_MIN_ROWS = 200000
+PARALLEL_SCAN_CHUNKS_PER_WORKER = 4
+VECTORIZED_MIN_ROWS = 10000
+VECTORIZED_STR_CACHE_BYTES = 64 * 1024 * 1024
+BENCH_SIZES = (1000, 10000, 100000)
+BENCH_REPEAT = 3
+BENCH_POINT_QUERIES = 100
+BENCH_INSERT_ROWS = 1000
+BENCH_SEED = 42
+BENCH_REGRESSION_THRESHOLD = 0.2
+BENCH_OUTPUT = 'bench.json'
+METRICS_BUCKETS_PER_DOUBLING = 16
+PROFILE_TOP_FUNCTIONS = 25
+STARTUP_IMPORT_BUDGET_MS = 60
+DURABILITY_MODES = ('sync', 'group')
+DEFAULT_DURABILITY = 'sync'
+FLUSH_EVERY = 1000
+FLUSH_INTERVAL_MS = 200
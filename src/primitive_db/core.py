@@ -1,44 +1,227 @@
-from src.primitive_db.constants import VALID_TYPES
-from src.primitive_db.decorators import (
-    handle_db_errors,
-    confirm_action,
-    log_time,
+from itertools import islice
+from operator import itemgetter
+
+from src.primitive_db import metrics, vectorized
+from src.primitive_db.constants import (
+    DEFAULT_TABLE_FORMAT,
+    JOIN_SPILL_ROWS,
+    SCAN_CHUNK_SIZE,
+    TABLE_FORMATS,
+    VALID_TYPES,
 )
+from src.primitive_db.decorators import confirm_action, handle_db_errors
+from src.primitive_db.indexes import INDEX_KINDS
+from src.primitive_db.join import (
+    join_positions,
+    join_strategy,
+    joined_columns,
+    joined_rows,
+    qualify_command,
+    split_where,
+)
+from src.primitive_db.parallel import (
+    parallel_scan,
+    should_scan_in_parallel,
+    worker_count,
+)
+from src.primitive_db.parser import format_where, is_identifier, item_label
+from src.primitive_db.planner import collect_stats, plan_candidates, plan_query
+from src.primitive_db.predicate import compile_predicate, compile_row_predicate
+from src.primitive_db.query import (
+    aggregate_rows,
+    count_groups_from_index,
+    is_aggregate,
+    order_positions,
+    order_rows,
+    output_columns,
+    project_rows,
+    select_fields,
+)
+from src.primitive_db.schema import Schema, table_schema
+from src.primitive_db.table import COLUMN_TYPES
+from src.primitive_db.vectorized import should_vectorize
+
+
+def _scan_large(table, where_clause):
+    # Большая таблица без подходящего индекса проверяется масками NumPy
+    # или несколькими процессами; None - если обычный просмотр.
+    if should_vectorize(table):
+        positions = vectorized.find_positions(table, where_clause)
+        if positions is not None:
+            return positions
+    if not should_scan_in_parallel(table):
+        return None
+    return parallel_scan(table, where_clause)
 
 
-def convert_value_type(value, target_type):
-    if target_type == 'int':
-        return int(value)
-    elif target_type == 'str':
-        return str(value)
-    elif target_type == 'bool':
-        if isinstance(value, bool):
-            return value
-        if isinstance(value, str):
-            return value.lower() in ('true', '1', 'yes')
-        return bool(value)
-    return value
+def find_positions(table, where_clause):
+    if where_clause is None:
+        metrics.add('rows_scanned', table.live_count)
+        return table.positions()
+
+    matches = compile_predicate(table, where_clause)
+    candidates = plan_candidates(table, plan_query(table, where_clause))
+    if candidates is None:
+        metrics.add('rows_scanned', table.live_count)
+        positions = _scan_large(table, where_clause)
+        if positions is not None:
+            return positions
+        candidates = table.positions()
+    else:
+        metrics.add('rows_scanned', len(candidates))
+    return matches(candidates)
+
+
+def iter_positions(table, where_clause, chunk_size=SCAN_CHUNK_SIZE):
+    # Просмотренные строки считаются по блокам: при limit просмотр
+    # останавливается раньше.
+    if where_clause is None:
+        for chunk in table.position_chunks(chunk_size):
+            metrics.add('rows_scanned', len(chunk))
+            yield from chunk
+        return
 
+    matches = compile_predicate(table, where_clause)
+    candidates = plan_candidates(table, plan_query(table, where_clause))
+    if candidates is not None:
+        metrics.add('rows_scanned', len(candidates))
+        yield from matches(candidates)
+        return
 
-@handle_db_errors
-def validate_record(record, metadata, table_name):
-    columns = metadata[table_name]
-    
-    for col_name, col_type in columns:
-        if col_name not in record:
-            return False, f"Отсутствует столбец: {col_name}"
-        
-        value = record[col_name]
-        expected_type = col_type
-        
-        if expected_type == 'int' and not isinstance(value, int):
-            return False, f"Неверный тип для столбца {col_name}: ожидается int"
-        elif expected_type == 'str' and not isinstance(value, str):
-            return False, f"Неверный тип для столбца {col_name}: ожидается str"
-        elif expected_type == 'bool' and not isinstance(value, bool):
-            return False, f"Неверный тип для столбца {col_name}: ожидается bool"
-    
-    return True, None
+    positions = _scan_large(table, where_clause)
+    if positions is not None:
+        metrics.add('rows_scanned', table.live_count)
+        yield from positions
+        return
+
+    # Полный просмотр идёт блоками, чтобы не держать в памяти все позиции.
+    for chunk in table.position_chunks(chunk_size):
+        metrics.add('rows_scanned', len(chunk))
+        yield from matches(chunk)
+
+
+ACCESS_NAMES = {
+    'scan': 'полный просмотр',
+    'index': 'поиск по индексу',
+    'range': 'просмотр диапазона индекса',
+}
+
+
+def _describe_plan(plan):
+    text = ACCESS_NAMES[plan['access']]
+    if plan['column'] is not None:
+        text += (
+            f' {plan["index"]}("{plan["column"]}") '
+            f'по условию {format_where(plan["condition"])}'
+        )
+    return f'{text}: строк ~{plan["rows"]:.0f}, стоимость {plan["cost"]:.1f}'
+
+
+def _count_from_index(table, command):
+    if command['group_by'] or command['columns'] != [('agg', 'count', None)]:
+        return None
+
+    where_clause = command['where']
+    if where_clause is None:
+        count = len(table)
+    else:
+        # Если всё условие отвечает индексу, строки не нужно проверять.
+        best = plan_query(table, where_clause)['best']
+        if best['access'] == 'scan' or best['condition'] != where_clause:
+            return None
+        count = len(plan_candidates(table, {'best': best}))
+    return [{'count(*)': count}]
+
+
+def _join_sides(table, join_table, command):
+    left_where, right_where, residual = split_where(
+        table, join_table, command['where']
+    )
+    sides = []
+    for side_table, column, where_clause in (
+        (table, command['on'][0], left_where),
+        (join_table, command['on'][1], right_where),
+    ):
+        sides.append({
+            'table': side_table,
+            'column': column,
+            'where': where_clause,
+            'positions': iter_positions(side_table, where_clause),
+            'rows': plan_query(side_table, where_clause)['best']['rows'],
+        })
+    return sides, residual
+
+
+def _filter_rows(rows, matches, chunk_size=SCAN_CHUNK_SIZE):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield from matches(chunk)
+
+
+def _iter_join(table, join_table, command):
+    command = qualify_command(table, join_table, command)
+    columns = joined_columns(table, join_table)
+    labels = output_columns(columns, command)
+    (left, right), residual = _join_sides(table, join_table, command)
+
+    # Предикаты для строк, найденных по индексу другой стороны.
+    matches = [
+        None if side['where'] is None
+        else compile_predicate(side['table'], side['where'])
+        for side in (left, right)
+    ]
+    rows = joined_rows(table, join_table, join_positions(left, right, *matches))
+    if residual is not None:
+        rows = _filter_rows(rows, compile_row_predicate(columns, residual))
+
+    limit, offset = command['limit'], command['offset']
+    stop = None if limit is None else offset + limit
+    if is_aggregate(command):
+        rows = aggregate_rows(rows, itemgetter, command)
+    if command['order_by']:
+        rows = order_rows(rows, command['order_by'], stop)
+    return labels, select_fields(islice(rows, offset, stop), labels)
+
+
+def iter_query(table, command, join_table=None):
+    if command.get('join'):
+        return _iter_join(table, join_table, command)
+
+    labels = output_columns(table.columns, command)
+    limit, offset = command['limit'], command['offset']
+    stop = None if limit is None else offset + limit
+    order_by = command['order_by']
+
+    if is_aggregate(command):
+        rows = _count_from_index(table, command)
+        if rows is None:
+            rows = count_groups_from_index(table, command)
+        if rows is None:
+            positions = iter_positions(table, command['where'])
+            rows = aggregate_rows(
+                positions, lambda column: table.stores[column].get, command
+            )
+        if order_by:
+            rows = order_rows(rows, order_by, stop)
+        return labels, select_fields(islice(rows, offset, stop), labels)
+
+    positions = iter_positions(table, command['where'])
+    if order_by:
+        positions = order_positions(table, positions, order_by, stop)
+    return labels, project_rows(table, islice(positions, offset, stop), labels)
+
+
+def _check_name(name):
+    if is_identifier(name):
+        return True
+    print(
+        f'Ошибка: Недопустимое имя "{name}": это ключевое слово '
+        'или в нём есть пробелы, кавычки, скобки, точки или операторы.'
+    )
+    return False
 
 
 @handle_db_errors
@@ -47,6 +230,9 @@ def create_table(metadata, table_name, columns):
         print(f'Ошибка: Таблица "{table_name}" уже существует.')
         return metadata
 
+    if not _check_name(table_name):
+        return metadata
+
     validated_columns = []
     validated_columns.append(('ID', 'int'))
 
@@ -62,9 +248,17 @@ def create_table(metadata, table_name, columns):
             print(f'Некорректное значение: {col_def}. Попробуйте снова.')
             return metadata
 
+        if not _check_name(col_name.strip()):
+            return metadata
+
         validated_columns.append((col_name.strip(), col_type))
 
-    metadata[table_name] = validated_columns
+    metadata[table_name] = {
+        'columns': validated_columns,
+        'indexes': {},
+        'next_id': 1,
+        'format': DEFAULT_TABLE_FORMAT,
+    }
 
     col_str = ', '.join([f'{name}:{type_}' for name, type_ in validated_columns])
     print(f'Таблица "{table_name}" успешно создана со столбцами: {col_str}')
@@ -92,15 +286,8 @@ def list_tables(metadata):
     return list(metadata.keys())
 
 
-@log_time
-@handle_db_errors
-def insert(metadata, table_name, values):
-    if table_name not in metadata:
-        print(f'Ошибка: Таблица "{table_name}" не существует.')
-        return None
-    
-    columns = metadata[table_name]
-    expected_count = len(columns) - 1
+def build_record(schema, values):
+    expected_count = len(schema.converters)
     
     if len(values) != expected_count:
         msg = (
@@ -110,120 +297,455 @@ def insert(metadata, table_name, values):
         print(msg)
         return None
     
-    record = {}
-    record['ID'] = 0
+    record = {'ID': 0}
     
-    for i, (col_name, col_type) in enumerate(columns[1:], 0):
-        value_str = values[i].strip()
+    # Преобразованное значение всегда нужного типа, проверять приходится
+    # только строки в кавычках.
+    for (col_name, convert, quoted_error), value_str in zip(
+        schema.converters, values
+    ):
+        value_str = value_str.strip()
         
-        if value_str.startswith('"') and value_str.endswith('"'):
-            value = value_str[1:-1]
-        elif value_str.startswith("'") and value_str.endswith("'"):
+        if (
+            value_str.startswith('"') and value_str.endswith('"')
+            or value_str.startswith("'") and value_str.endswith("'")
+        ):
+            if quoted_error is not None:
+                print(f'Ошибка валидации: {quoted_error}')
+                return None
             value = value_str[1:-1]
         else:
-            value = convert_value_type(value_str, col_type)
+            value = convert(value_str)
         
         record[col_name] = value
     
     return record
 
 
-@log_time
 @handle_db_errors
-def select(table_data, where_clause=None):
-    if where_clause is None:
-        return table_data
-    
-    filtered = []
-    for record in table_data:
-        match = True
-        for key, value in where_clause.items():
-            if key not in record or record[key] != value:
-                match = False
-                break
-        if match:
-            filtered.append(record)
-    
-    return filtered
+def insert(metadata, table_name, values):
+    if table_name not in metadata:
+        print(f'Ошибка: Таблица "{table_name}" не существует.')
+        return None
+
+    return build_record(table_schema(metadata, table_name), values)
+
+
+@handle_db_errors
+def insert_many(metadata, table_name, rows):
+    if table_name not in metadata:
+        print(f'Ошибка: Таблица "{table_name}" не существует.')
+        return None
+
+    schema = table_schema(metadata, table_name)
+    records = []
+    for row_number, values in enumerate(rows, 1):
+        record = build_record(schema, values)
+        if record is None:
+            print(f'Ошибка в строке {row_number}: ни одна запись не добавлена.')
+            return None
+        records.append(record)
+
+    return records
+
+
+@handle_db_errors
+def convert_records(metadata, table_name, numbered_records):
+    # numbered_records - пары (номер строки в файле, запись).
+    schema = table_schema(metadata, table_name)
+    records = []
+
+    for row_number, raw_record in numbered_records:
+        record = {'ID': 0}
+        for col_name, convert in schema.importers:
+            if col_name not in raw_record:
+                print(
+                    f'Ошибка в строке {row_number}: '
+                    f'отсутствует столбец {col_name}.'
+                )
+                return None
+            try:
+                record[col_name] = convert(raw_record[col_name])
+            except (TypeError, ValueError):
+                print(
+                    f'Ошибка в строке {row_number}: неверное значение '
+                    f'для столбца {col_name}: ожидается '
+                    f'{schema.types[col_name]}.'
+                )
+                return None
+
+        records.append(record)
+
+    return records
+
+
+@handle_db_errors
+def create_index(metadata, table_name, column, kind='hash'):
+    if table_name not in metadata:
+        print(f'Ошибка: Таблица "{table_name}" не существует.')
+        return metadata
+
+    column_names = [col[0] for col in metadata[table_name]['columns']]
+    if column not in column_names:
+        print(f'Ошибка: Столбец "{column}" не существует в таблице "{table_name}".')
+        return metadata
+
+    if kind not in INDEX_KINDS:
+        print(f'Некорректное значение: {kind}. Попробуйте снова.')
+        return metadata
+
+    indexes = metadata[table_name].setdefault('indexes', {})
+    if column == 'ID' or indexes.get(column) == kind:
+        print(f'Ошибка: Индекс по столбцу "{column}" уже существует.')
+        return metadata
+
+    indexes[column] = kind
+    print(
+        f'Индекс {kind} по столбцу "{column}" '
+        f'таблицы "{table_name}" успешно создан.'
+    )
+
+    return metadata
+
+
+@handle_db_errors
+def set_table_format(metadata, table_name, table_format):
+    if table_name not in metadata:
+        print(f'Ошибка: Таблица "{table_name}" не существует.')
+        return metadata
+
+    if table_format not in TABLE_FORMATS:
+        print(f'Некорректное значение: {table_format}. Попробуйте снова.')
+        return metadata
+
+    if metadata[table_name].get('format', DEFAULT_TABLE_FORMAT) == table_format:
+        print(f'Таблица "{table_name}" уже хранится в формате {table_format}.')
+        return metadata
+
+    metadata[table_name]['format'] = table_format
+    print(f'Таблица "{table_name}" переведена в формат {table_format}.')
+
+    return metadata
+
+
+def _check_alter(metadata, table_name, column):
+    if table_name not in metadata:
+        print(f'Ошибка: Таблица "{table_name}" не существует.')
+        return False
+
+    column_names = [col[0] for col in metadata[table_name]['columns']]
+    if column not in column_names:
+        print(f'Ошибка: Столбец "{column}" не существует в таблице "{table_name}".')
+        return False
+
+    if column == 'ID':
+        print('Ошибка: Столбец ID нельзя изменить.')
+        return False
+
+    return True
+
+
+def _record_change(table_meta, change):
+    # Файлы таблицы не перезаписываются: изменение запоминается с новой
+    # версией схемы, и строки старых версий приводятся к ней при чтении.
+    version = table_meta.get('schema_version', 0) + 1
+    table_meta['schema_version'] = version
+    table_meta.setdefault('schema_changes', []).append(
+        {'version': version, **change}
+    )
+
+
+def _rename_key(mapping, old_name, new_name):
+    if mapping and old_name in mapping:
+        mapping[new_name] = mapping.pop(old_name)
+
+
+@handle_db_errors
+def add_column(metadata, table_name, col_def, default=None):
+    if table_name not in metadata:
+        print(f'Ошибка: Таблица "{table_name}" не существует.')
+        return metadata
+
+    if ':' not in col_def:
+        print(f'Некорректное значение: {col_def}. Попробуйте снова.')
+        return metadata
+
+    col_name, col_type = col_def.rsplit(':', 1)
+    col_name, col_type = col_name.strip(), col_type.strip().lower()
+    if col_type not in VALID_TYPES:
+        print(f'Некорректное значение: {col_def}. Попробуйте снова.')
+        return metadata
+
+    if not _check_name(col_name):
+        return metadata
+
+    table_meta = metadata[table_name]
+    if col_name in [col[0] for col in table_meta['columns']]:
+        print(f'Ошибка: Столбец "{col_name}" уже существует.')
+        return metadata
+
+    value = COLUMN_TYPES[col_type].default
+    if default is not None:
+        # Значение по умолчанию разбирается так же, как значение в insert.
+        schema = Schema((('ID', 'int'), (col_name, col_type)))
+        record = build_record(schema, [default])
+        if record is None:
+            return metadata
+        value = record[col_name]
+
+    table_meta['columns'].append([col_name, col_type])
+    _record_change(table_meta, {
+        'op': 'add', 'column': col_name, 'type': col_type, 'default': value,
+    })
+    print(
+        f'Столбец {col_name}:{col_type} добавлен в таблицу "{table_name}" '
+        f'(по умолчанию: {value!r}).'
+    )
+
+    return metadata
+
+
+@confirm_action("удаление столбца")
+@handle_db_errors
+def drop_column(metadata, table_name, column):
+    if not _check_alter(metadata, table_name, column):
+        return metadata
+
+    table_meta = metadata[table_name]
+    table_meta['columns'] = [
+        col for col in table_meta['columns'] if col[0] != column
+    ]
+    table_meta.get('indexes', {}).pop(column, None)
+    ((table_meta.get('stats') or {}).get('columns') or {}).pop(column, None)
+    _record_change(table_meta, {'op': 'drop', 'column': column})
+    print(f'Столбец "{column}" удалён из таблицы "{table_name}".')
+
+    return metadata
+
+
+@handle_db_errors
+def rename_column(metadata, table_name, column, new_name):
+    if not _check_alter(metadata, table_name, column):
+        return metadata
+
+    if not _check_name(new_name):
+        return metadata
+
+    table_meta = metadata[table_name]
+    if new_name in [col[0] for col in table_meta['columns']]:
+        print(f'Ошибка: Столбец "{new_name}" уже существует.')
+        return metadata
+
+    table_meta['columns'] = [
+        [new_name if col_name == column else col_name, col_type]
+        for col_name, col_type in table_meta['columns']
+    ]
+    _rename_key(table_meta.get('indexes'), column, new_name)
+    _rename_key((table_meta.get('stats') or {}).get('columns'), column, new_name)
+    _record_change(
+        table_meta, {'op': 'rename', 'column': column, 'to': new_name}
+    )
+    print(
+        f'Столбец "{column}" таблицы "{table_name}" '
+        f'переименован в "{new_name}".'
+    )
+
+    return metadata
 
 
 @handle_db_errors
-def update(table_data, metadata, table_name, set_clause, where_clause):
+def select(table, command, join_table=None):
+    labels, rows = iter_query(table, command, join_table)
+    return labels, list(rows)
+
+
+@handle_db_errors
+def stream_select(table, command, join_table=None):
+    return iter_query(table, command, join_table)
+
+
+@handle_db_errors
+def update(table, metadata, table_name, set_clause, where_clause):
     if table_name not in metadata:
-        return table_data, 0, []
+        return table, 0, []
     
-    columns = metadata[table_name]
-    column_dict = {col[0]: col[1] for col in columns}
+    schema = table_schema(metadata, table_name)
     
-    for key in set_clause.keys():
-        if key not in column_dict:
+    # None - изменение отклонено, сообщение об ошибке уже выведено.
+    for key, value in set_clause.items():
+        if key == 'ID':
+            print('Ошибка: Столбец "ID" нельзя изменять.')
+            return None
+        if key not in schema.types:
             print(f'Ошибка: Столбец "{key}" не существует в таблице "{table_name}".')
-            return table_data, 0, []
-        value = set_clause[key]
-        expected_type = column_dict[key]
-        if expected_type == 'int' and not isinstance(value, int):
-            print(f'Ошибка: Неверный тип для столбца {key}: ожидается int.')
-            return table_data, 0, []
-        elif expected_type == 'str' and not isinstance(value, str):
-            print(f'Ошибка: Неверный тип для столбца {key}: ожидается str.')
-            return table_data, 0, []
-        elif expected_type == 'bool' and not isinstance(value, bool):
-            print(f'Ошибка: Неверный тип для столбца {key}: ожидается bool.')
-            return table_data, 0, []
+            return None
+        if not isinstance(value, schema.python_types[key]):
+            print(
+                f'Ошибка: Неверный тип для столбца {key}: '
+                f'ожидается {schema.types[key]}.'
+            )
+            return None
     
+    positions = list(find_positions(table, where_clause))
+    updated_ids = vectorized.update_rows(table, positions, set_clause)
+    if updated_ids is not None:
+        return table, len(updated_ids), updated_ids
+
     updated_count = 0
     updated_ids = []
     
-    for record in table_data:
-        match = True
-        for key, value in where_clause.items():
-            if key not in record or record[key] != value:
-                match = False
-                break
-        
-        if match:
-            for key, value in set_clause.items():
-                if key in record:
-                    record[key] = value
-            updated_count += 1
-            updated_ids.append(record.get('ID', 'unknown'))
+    for pos in positions:
+        table.update(pos, set_clause)
+        updated_count += 1
+        updated_ids.append(table.get(pos, 'ID'))
     
-    return table_data, updated_count, updated_ids
+    return table, updated_count, updated_ids
 
 
 @confirm_action("удаление записи")
 @handle_db_errors
-def delete(table_data, where_clause):
-    deleted_count = 0
+def delete(table, where_clause):
     deleted_ids = []
-    filtered = []
+
+    for pos in list(find_positions(table, where_clause)):
+        deleted_ids.append(table.get(pos, 'ID'))
+        table.delete(pos)
     
-    for record in table_data:
-        match = True
-        for key, value in where_clause.items():
-            if key not in record or record[key] != value:
-                match = False
-                break
-        
-        if match:
-            deleted_count += 1
-            deleted_ids.append(record.get('ID', 'unknown'))
+    return table, len(deleted_ids), deleted_ids
+
+
+def _explain_order(command):
+    if not command['order_by']:
+        return
+    order_str = ', '.join(
+        item_label(item) + (' desc' if descending else '')
+        for item, descending in command['order_by']
+    )
+    limit = command['limit']
+    if limit is None:
+        print(f'Сортировка: {order_str}, полная')
+    else:
+        print(f'Сортировка: {order_str}, '
+              f'top-{command["offset"] + limit} через кучу')
+
+
+def _explain_join(table, join_table, command):
+    command = qualify_command(table, join_table, command)
+    output_columns(joined_columns(table, join_table), command)
+    (left, right), residual = _join_sides(table, join_table, command)
+    for side in (left, right):
+        if side['where'] is not None:
+            compile_predicate(side['table'], side['where'])
+
+    print(
+        f'План соединения таблиц "{table.name}" и "{join_table.name}" '
+        f'по условию {table.name}.{left["column"]} = '
+        f'{join_table.name}.{right["column"]}:'
+    )
+    for side in (left, right):
+        best = plan_query(side['table'], side['where'])['best']
+        print(f'Таблица "{side["table"].name}": {_describe_plan(best)}')
+        if side['where'] is not None:
+            print(f'Фильтр до соединения: {format_where(side["where"])}')
+
+    strategy, inner = join_strategy(left, right)
+    inner_name = inner['table'].name
+    if strategy == 'index':
+        index = inner['table'].indexes[inner['column']]
+        print(
+            f'Соединение: поиск пар по индексу {index.kind}'
+            f'("{inner["column"]}") таблицы "{inner_name}"'
+        )
+    else:
+        print(
+            f'Соединение: хеш-таблица по таблице "{inner_name}" '
+            f'(~{inner["rows"]:.0f} строк), свыше {JOIN_SPILL_ROWS} строк - '
+            f'разделы во временных файлах'
+        )
+    if residual is not None:
+        print(f'Фильтр после соединения: {format_where(residual)}')
+    if is_aggregate(command):
+        group_str = ', '.join(command['group_by']) or 'без группировки'
+        print(f'Агрегация за один проход: {group_str}')
+    _explain_order(command)
+
+
+@handle_db_errors
+def explain(table, command, join_table=None):
+    if command.get('join'):
+        _explain_join(table, join_table, command)
+        return
+
+    where_clause = command['where']
+    output_columns(table.columns, command)
+    if where_clause is not None:
+        # Компиляция проверяет столбцы и типы так же, как при выполнении.
+        compile_predicate(table, where_clause)
+    plan = plan_query(table, where_clause)
+
+    print(f'План запроса к таблице "{table.name}":')
+    print(f'Доступ: {_describe_plan(plan["best"])}')
+    if where_clause is not None:
+        print(f'Фильтр: {format_where(where_clause)}')
+        if plan['best']['access'] == 'scan':
+            if should_vectorize(table):
+                print('Векторизованный просмотр: маски NumPy')
+            elif should_scan_in_parallel(table):
+                print(f'Параллельный просмотр: процессов {worker_count()}')
+    if is_aggregate(command):
+        group_str = ', '.join(command['group_by']) or 'без группировки'
+        if (_count_from_index(table, command) is not None
+                or count_groups_from_index(table, command) is not None):
+            print(f'Подсчёт по индексу без просмотра таблицы: {group_str}')
         else:
-            filtered.append(record)
-    
-    return filtered, deleted_count, deleted_ids
+            print(f'Агрегация за один проход: {group_str}')
+    _explain_order(command)
+    print('Рассмотренные варианты:')
+    for alternative in plan['alternatives']:
+        print(f'- {_describe_plan(alternative)}')
+    if table.stats:
+        print(f'Статистика: собрана командой analyze '
+              f'({table.stats["rows"]} записей).')
+    else:
+        print('Статистика: не собрана, оценки построены по индексам.')
 
 
 @handle_db_errors
-def info(metadata, table_name, table_data):
+def analyze_table(metadata, table_name, table):
+    if table_name not in metadata:
+        print(f'Ошибка: Таблица "{table_name}" не существует.')
+        return metadata
+
+    stats = collect_stats(table)
+    metadata[table_name]['stats'] = stats
+    print(
+        f'Статистика таблицы "{table_name}" собрана: '
+        f'{stats["rows"]} записей, {len(stats["columns"])} столбцов.'
+    )
+
+    return metadata
+
+
+@handle_db_errors
+def info(metadata, table_name, table):
     if table_name not in metadata:
         print(f'Ошибка: Таблица "{table_name}" не существует.')
         return
     
-    columns = metadata[table_name]
+    columns = metadata[table_name]['columns']
     col_str = ', '.join([f'{name}:{type_}' for name, type_ in columns])
     
     print(f'Таблица: {table_name}')
     print(f'Столбцы: {col_str}')
-    print(f'Количество записей: {len(table_data)}')
+    print(f'Количество записей: {len(table)}')
+    print(f'Формат: {metadata[table_name].get("format", DEFAULT_TABLE_FORMAT)}')
+    if metadata[table_name].get('schema_version'):
+        print(f'Версия схемы: {metadata[table_name]["schema_version"]}')
+
+    indexes = metadata[table_name].get('indexes', {})
+    if indexes:
+        index_str = ', '.join(
+            [f'{column}:{kind}' for column, kind in indexes.items()]
+        )
+        print(f'Индексы: {index_str}')
 
@@ -1,7 +1,12 @@
 import functools
-import time
 
-import prompt
+# В пакетном режиме спросить подтверждение не у кого.
+_auto_confirm = False
+
+
+def set_auto_confirm(enabled):
+    global _auto_confirm
+    _auto_confirm = enabled
 
 
 def handle_db_errors(func):
@@ -40,6 +45,10 @@ def confirm_action(action_name):
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
+            if _auto_confirm:
+                return func(*args, **kwargs)
+            import prompt
+
             response = prompt.string(
                 f'Вы уверены, что хотите выполнить "{action_name}"? [y/n]: '
             ).strip().lower()
@@ -52,32 +61,3 @@ def confirm_action(action_name):
         return wrapper
     return decorator
 
-
-def log_time(func):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        start_time = time.monotonic()
-        result = func(*args, **kwargs)
-        end_time = time.monotonic()
-        elapsed = end_time - start_time
-        print(f"Функция {func.__name__} выполнилась за {elapsed:.3f} секунд.")
-        return result
-    return wrapper
-
-
-def create_cacher():
-    cache = {}
-    
-    def cache_result(key, value_func):
-        if key in cache:
-            return cache[key]
-        result = value_func()
-        cache[key] = result
-        return result
-    
-    def clear_cache():
-        cache.clear()
-    
-    cache_result.clear = clear_cache
-    return cache_result
-
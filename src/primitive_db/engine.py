@@ -1,29 +1,81 @@
-import re
+import copy
+import io
 import shlex
+import time
+from contextlib import redirect_stdout
+from itertools import islice
 
-import prompt
-from prettytable import PrettyTable
-
-from src.primitive_db.constants import METADATA_FILE
+from src.primitive_db import metrics
+from src.primitive_db.cache import (
+    ResultCache,
+    estimate_row_size,
+    estimate_rows_size,
+)
+from src.primitive_db.constants import (
+    BATCH_COMMIT_EVERY,
+    DEFAULT_DURABILITY,
+    DISPLAY_CHUNK_SIZE,
+    FLUSH_EVERY,
+    FLUSH_INTERVAL_MS,
+    IMPORT_BATCH_SIZE,
+    RESULT_CACHE_MAX_BYTES,
+    RESULT_CACHE_MAX_ENTRIES,
+)
 from src.primitive_db.core import (
+    add_column,
+    analyze_table,
+    convert_records,
+    create_index,
     create_table,
     delete,
+    drop_column,
     drop_table,
+    explain,
     info,
     insert,
+    insert_many,
+    iter_query,
     list_tables,
+    rename_column,
     select,
+    set_table_format,
+    stream_select,
     update,
 )
-from src.primitive_db.decorators import create_cacher
-from src.primitive_db.parser import parse_set_clause, parse_where_clause
+from src.primitive_db.decorators import set_auto_confirm
+from src.primitive_db.parser import ParseError, parse_command
+from src.primitive_db.session import Session
 from src.primitive_db.utils import (
-    load_metadata,
-    load_table_data,
-    save_metadata,
-    save_table_data,
+    convert_table_data,
+    delete_table_data,
+    export_rows,
+    get_table_format,
+    read_import_file,
+    rebuild_table_indexes,
+    remove_old_table_data,
+)
+
+query_cache = ResultCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_BYTES)
+
+# Эти команды меняют файлы таблицы напрямую и не могут быть отменены.
+TRANSACTION_DDL_ERROR = (
+    'Ошибка: Команда недоступна внутри транзакции. '
+    'Выполните commit или rollback.'
+)
+
+# Все сообщения об ошибках команд начинаются с одного из этих слов.
+ERROR_PREFIXES = (
+    'Ошибка', 'Некорректное значение', 'Функции нет',
+    'Произошла непредвиденная ошибка',
 )
-cache_result = create_cacher()
+
+# Задержки собираются по первому слову команды.
+STATEMENT_KINDS = {
+    'insert', 'select', 'explain', 'analyze', 'export', 'update', 'delete',
+    'import', 'info', 'cache_stats', 'stats', 'profile', 'begin', 'commit',
+    'rollback', 'flush', 'exit', 'help', 'create_table', 'create_index', 'set_format',
+    'list_tables', 'drop_table', 'alter',
+}
 
 
 def print_help():
@@ -35,354 +87,842 @@ def print_help():
     )
     print("<command> list_tables - показать список всех таблиц")
     print("<command> drop_table <имя_таблицы> - удалить таблицу")
+    print(
+        "<command> create_index <имя_таблицы> <столбец> [hash|sorted] "
+        "- создать индекс по столбцу"
+    )
+    print(
+        "<command> alter table <имя_таблицы> add column <столбец:тип> "
+        "[default <значение>] | drop column <столбец> "
+        "| rename column <столбец> to <новое_имя> - изменить столбцы таблицы"
+    )
+    print(
+        "<command> set_format <имя_таблицы> json|binary "
+        "- сменить формат хранения таблицы"
+    )
     print(
         "<command> insert into <имя_таблицы> values "
         "(<значение1>, <значение2>, ...) - создать запись."
     )
     print(
-        "<command> select from <имя_таблицы> where <столбец> = <значение> "
+        "<command> insert into <имя_таблицы> values (...), (...), ... "
+        "- создать несколько записей."
+    )
+    print(
+        "<command> import <имя_таблицы> <файл.csv|файл.jsonl> "
+        "- загрузить записи из файла."
+    )
+    print(
+        "<command> select from <имя_таблицы> where <условие> "
         "- прочитать записи по условию."
     )
     print(
         "<command> select from <имя_таблицы> - прочитать все записи."
     )
     print(
-        "<command> update <имя_таблицы> set <столбец1> = <новое_значение1> "
-        "where <столбец_условия> = <значение_условия> - обновить запись."
+        "<command> select from <имя_таблицы> [where ...] [limit N] [offset M] "
+        "[into <файл>] - постраничный вывод или выгрузка в файл."
+    )
+    print(
+        "<command> select <столбец>, <функция>(<столбец>|*), ... from <имя_таблицы> "
+        "[where ...] [group by ...] [order by <столбец> [desc], ...] [limit N] "
+        "- выбрать столбцы, отсортировать, посчитать count/sum/min/max/avg."
+    )
+    print(
+        "<command> select ... from <таблица1> join <таблица2> "
+        "on <таблица1>.<столбец> = <таблица2>.<столбец> [where ...] "
+        "- соединить две таблицы."
+    )
+    print(
+        "<command> export <имя_таблицы> [where ...] to <файл.csv|файл.jsonl> "
+        "- выгрузить записи в файл."
+    )
+    print(
+        "<command> update <имя_таблицы> set <столбец1> = <новое_значение1>, ... "
+        "where <условие> - обновить записи."
+    )
+    print(
+        "<command> delete from <имя_таблицы> where <условие> "
+        "- удалить записи."
     )
     print(
-        "<command> delete from <имя_таблицы> where <столбец> = <значение> "
-        "- удалить запись."
+        "<условие>: сравнения =, !=, <, <=, >, >=, <столбец> [not] in (...), "
+        "<столбец> between A and B, объединённые and, or, not и скобками."
+    )
+    print(
+        "<command> explain select from <имя_таблицы> [where ...] "
+        "- показать план выполнения запроса."
+    )
+    print(
+        "<command> analyze <имя_таблицы> "
+        "- собрать статистику по столбцам для планировщика."
     )
     print("<command> info <имя_таблицы> - вывести информацию о таблице.")
+    print(
+        "<command> begin / commit / rollback "
+        "- начать, зафиксировать или отменить транзакцию."
+    )
+    print(
+        "<command> flush "
+        "- записать на диск изменения, накопленные в режиме group."
+    )
+    print("<command> cache_stats - статистика кэша запросов.")
+    print(
+        "<command> stats [on|off|reset|save <файл.json>] "
+        "- задержки операций и счётчики."
+    )
+    print(
+        "<command> profile <команда> "
+        "- выполнить команду под cProfile и показать самые долгие функции."
+    )
     print("<command> exit - выход из программы")
     print("<command> help - справочная информация")
 
 
-def display_table(table_data, metadata, table_name):
-    if not table_data:
-        return
-    
-    columns = metadata[table_name]
-    table = PrettyTable()
-    
-    field_names = [col[0] for col in columns]
-    table.field_names = field_names
-    
-    for record in table_data:
-        row = []
-        for col_name, _ in columns:
-            value = record.get(col_name, '')
-            if isinstance(value, bool):
-                value = 'True' if value else 'False'
-            row.append(value)
-        table.add_row(row)
-    
-    print(table)
+def display_table(table_data, field_names, chunk_size=DISPLAY_CHUNK_SIZE):
+    # Строки выводятся порциями, чтобы вывод начинался сразу.
+    # prettytable загружается при первом выводе таблицы.
+    from prettytable import PrettyTable
 
+    rows = iter(table_data)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
 
-def parse_insert_command(user_input):
-    pattern = r'insert\s+into\s+(\w+)\s+values\s+\((.*)\)'
-    match = re.search(pattern, user_input, re.IGNORECASE)
-    if not match:
-        return None, None
-    
-    table_name = match.group(1)
-    values_str = match.group(2).strip()
-    
-    try:
-        values = []
-        current_value = ""
-        in_quotes = False
-        quote_char = None
-        i = 0
+        table = PrettyTable()
+        table.field_names = field_names
         
-        while i < len(values_str):
-            char = values_str[i]
-            
-            if char in ('"', "'") and (i == 0 or values_str[i-1] != '\\'):
-                if not in_quotes:
-                    in_quotes = True
-                    quote_char = char
-                    current_value += char
-                elif char == quote_char:
-                    in_quotes = False
-                    quote_char = None
-                    current_value += char
-                else:
-                    current_value += char
-            elif char == ',' and not in_quotes:
-                if current_value.strip():
-                    values.append(current_value.strip())
-                current_value = ""
-            else:
-                current_value += char
-            
-            i += 1
+        for record in chunk:
+            row = []
+            for col_name in field_names:
+                value = record.get(col_name, '')
+                if isinstance(value, bool):
+                    value = 'True' if value else 'False'
+                elif value is None:
+                    value = ''
+                row.append(value)
+            table.add_row(row)
         
-        if current_value.strip():
-            values.append(current_value.strip())
-        
-        return table_name, values
-    except Exception:
-        return None, None
+        print(table)
 
 
-def parse_select_command(user_input):
-    pattern = r'select\s+from\s+(\w+)(?:\s+where\s+(.+))?'
-    match = re.search(pattern, user_input, re.IGNORECASE)
-    if not match:
-        return None, None
-    
-    table_name = match.group(1)
-    where_clause_str = match.group(2) if match.group(2) else None
-    
-    where_clause = None
-    if where_clause_str:
-        where_clause = parse_where_clause(where_clause_str.strip())
-    
-    return table_name, where_clause
+def load_query_tables(session, metadata, command):
+    table_names = [command['table']]
+    if command.get('join'):
+        table_names.append(command['join']['table'])
 
+    for table_name in table_names:
+        if table_name not in metadata:
+            print(f'Ошибка: Таблица "{table_name}" не существует.')
+            return None
 
-def parse_update_command(user_input):
-    pattern = r'update\s+(\w+)\s+set\s+(.+?)\s+where\s+(.+)'
-    match = re.search(pattern, user_input, re.IGNORECASE)
-    if not match:
-        return None, None, None
-    
-    table_name = match.group(1)
-    set_clause_str = match.group(2)
-    where_clause_str = match.group(3)
-    
-    set_clause = parse_set_clause(set_clause_str.strip())
-    where_clause = parse_where_clause(where_clause_str.strip())
-    
-    return table_name, set_clause, where_clause
+    tables = [session.load_table(table_name, metadata) for table_name in table_names]
+    return tables[0], tables[1] if len(tables) > 1 else None
 
 
-def parse_delete_command(user_input):
-    pattern = r'delete\s+from\s+(\w+)\s+where\s+(.+)'
-    match = re.search(pattern, user_input, re.IGNORECASE)
-    if not match:
-        return None, None
-    
-    table_name = match.group(1)
-    where_clause_str = match.group(2)
-    
-    where_clause = parse_where_clause(where_clause_str.strip())
-    
-    return table_name, where_clause
+def _stream_rows(table_name, cache_key, version, labels, rows):
+    # Строки отдаются по мере вычисления; результат попадает в кэш,
+    # только если целиком уместился в его бюджет.
+    collected, size = [], 0
+    for row in rows:
+        if collected is not None:
+            collected.append(row)
+            size += estimate_row_size(row)
+            if size > query_cache.max_bytes:
+                collected = None
+        metrics.add('rows_returned')
+        yield row
+    if collected is not None:
+        query_cache.put(
+            table_name, cache_key, version, (labels, collected), size
+        )
 
 
-def run():
-    print("***Операции с данными***")
-    print("\nФункции:")
-    print(
-        "<command> create_table <имя_таблицы> "
-        "<столбец1:тип> <столбец2:тип> .. - создать таблицу"
-    )
-    print("<command> list_tables - показать список всех таблиц")
-    print("<command> drop_table <имя_таблицы> - удалить таблицу")
-    print(
-        "<command> insert into <имя_таблицы> values "
-        "(<значение1>, <значение2>, ...) - создать запись."
-    )
-    print(
-        "<command> select from <имя_таблицы> where <столбец> = <значение> "
-        "- прочитать записи по условию."
-    )
-    print(
-        "<command> select from <имя_таблицы> - прочитать все записи."
-    )
+def run_query(command, session, stream=False):
+    # stream=True - для вывода в консоль: выборка без limit не собирается
+    # в список целиком, и первые строки печатаются сразу.
+    metadata = session.load_metadata()
+    tables = load_query_tables(session, metadata, command)
+    if tables is None:
+        return None
+
+    table, join_table = tables
+    # Результат соединения зависит от версий обеих таблиц.
+    version = table.version
+    if join_table is not None:
+        version = (table.version, join_table.version)
+    cache_key = str(command)
+    result = query_cache.get(command['table'], cache_key, version)
+    if result is None:
+        metrics.add('query_cache_misses')
+        if stream and command['limit'] is None:
+            result = stream_select(table, command, join_table)
+            if result is None:
+                return None
+            labels, rows = result
+            return labels, _stream_rows(
+                command['table'], cache_key, version, labels, rows
+            )
+        result = select(table, command, join_table)
+        if result is None:
+            return None
+        query_cache.put(
+            command['table'], cache_key, version, result,
+            estimate_rows_size(result[1]),
+        )
+    else:
+        metrics.add('query_cache_hits')
+    metrics.add('rows_returned', len(result[1]))
+    return result
+
+
+def export_query(table_name, table, command, filepath, join_table=None):
+    start_time = time.monotonic()
+    try:
+        column_names, rows = iter_query(table, command, join_table)
+        count = export_rows(filepath, column_names, rows)
+    except KeyError as e:
+        print(f'Ошибка: Таблица или столбец {e} не найден.')
+        return
+    except (OSError, ValueError) as e:
+        print(f'Ошибка экспорта: {e}')
+        return
+
     print(
-        "<command> update <имя_таблицы> set <столбец1> = <новое_значение1> "
-        "where <столбец_условия> = <значение_условия> - обновить запись."
+        f'Экспортировано записей из таблицы "{table_name}" '
+        f'в файл "{filepath}": {count}.'
     )
-    print(
-        "<command> delete from <имя_таблицы> where <столбец> = <значение> "
-        "- удалить запись."
+    print_batch_report(count, time.monotonic() - start_time)
+
+
+def parse_query(user_input):
+    try:
+        return parse_command(user_input)
+    except ParseError as e:
+        print(f'Некорректное значение: {e}. Попробуйте снова.')
+        return None
+
+
+def parse_alter(user_input):
+    # alter table <таблица> add column <столбец:тип> [default <значение>]
+    # alter table <таблица> drop column <столбец>
+    # alter table <таблица> rename column <столбец> to <новое_имя>
+    parts = user_input.split(None, 5)
+    if len(parts) != 6 or parts[4].lower() != 'column':
+        return None
+    table_name, action, rest = parts[2], parts[3].lower(), parts[5]
+
+    if action == 'add':
+        args = rest.split(None, 2)
+        if len(args) == 1:
+            return {'action': action, 'table': table_name, 'column': args[0]}
+        if len(args) == 3 and args[1].lower() == 'default':
+            return {
+                'action': action,
+                'table': table_name,
+                'column': args[0],
+                'default': args[2],
+            }
+        return None
+
+    args = rest.split()
+    if action == 'drop' and len(args) == 1:
+        return {'action': action, 'table': table_name, 'column': args[0]}
+    if action == 'rename' and len(args) == 3 and args[1].lower() == 'to':
+        return {
+            'action': action,
+            'table': table_name,
+            'column': args[0],
+            'new_name': args[2],
+        }
+    return None
+
+
+def alter_table(metadata, command):
+    table_name, column = command['table'], command['column']
+    if command['action'] == 'add':
+        return add_column(metadata, table_name, column, command.get('default'))
+    if command['action'] == 'drop':
+        return drop_column(metadata, table_name, column)
+    return rename_column(metadata, table_name, column, command['new_name'])
+
+
+def store_records(session, metadata, table_name, records):
+    # ID резервируются в метаданных до записи строк и не повторяются,
+    # даже если в ту же таблицу пишут несколько процессов.
+    first_id = session.allocate_ids(metadata, table_name, len(records))
+    for offset, record in enumerate(records):
+        record['ID'] = first_id + offset
+
+    session.log_changes(
+        table_name,
+        [{'op': 'insert', 'row': record} for record in records],
+        metadata,
     )
-    print("<command> info <имя_таблицы> - вывести информацию о таблице.")
-    print("<command> exit - выход из программы")
-    print("<command> help - справочная информация\n")
+    return first_id
 
-    while True:
-        user_input = prompt.string(">>> Введите команду: ").strip()
 
-        if not user_input:
-            continue
+def print_batch_report(count, elapsed):
+    rate = count / elapsed if elapsed > 0 else float(count)
+    print(f'Обработано записей: {count} за {elapsed:.3f} секунд '
+          f'({rate:.0f} записей/с).')
 
-        if user_input.lower().startswith('insert into'):
-            table_name, values = parse_insert_command(user_input)
-            if table_name is None or values is None:
-                print("Некорректное значение. Попробуйте снова.")
-                continue
-            
-            metadata = load_metadata(METADATA_FILE)
-            if table_name not in metadata:
-                print(f'Ошибка: Таблица "{table_name}" не существует.')
-                continue
-            
-            record = insert(metadata, table_name, values)
+
+def statement_kind(user_input):
+    kind = user_input.split(None, 1)[0].lower()
+    return kind if kind in STATEMENT_KINDS else 'other'
+
+
+def execute(user_input, session):
+    # Команды stats не замеряются, чтобы не попадать в собственный отчёт.
+    if not user_input or not metrics.is_enabled():
+        return _execute(user_input, session)
+    kind = statement_kind(user_input)
+    if kind == 'stats':
+        return _execute(user_input, session)
+    with metrics.timer(kind):
+        return _execute(user_input, session)
+
+
+def execute_with_status(user_input, session):
+    # Для сервера: вывод команды и признак успеха - не было ли в выводе
+    # сообщения об ошибке.
+    output = io.StringIO()
+    with redirect_stdout(output):
+        keep_open = execute(user_input, session)
+    text = output.getvalue()
+    ok = not any(line.startswith(ERROR_PREFIXES) for line in text.splitlines())
+    return keep_open, text, ok
+
+
+def print_metrics():
+    report = metrics.snapshot()
+    if not report['enabled'] and not report['operations']:
+        print('Сбор метрик выключен. Включите его командой "stats on".')
+        return
+
+    from prettytable import PrettyTable
+
+    table = PrettyTable()
+    table.field_names = [
+        'Операция', 'Количество', 'p50, мс', 'p95, мс', 'p99, мс',
+        'Макс., мс', 'Всего, с',
+    ]
+    for operation, summary in report['operations'].items():
+        table.add_row([
+            operation,
+            summary['count'],
+            *(f'{summary[f"p{percent}"] * 1000:.3f}'
+              for percent in metrics.PERCENTILES),
+            f'{summary["max"] * 1000:.3f}',
+            f'{summary["total"]:.3f}',
+        ])
+    print(table)
+    for name, title in metrics.COUNTER_NAMES.items():
+        print(f'{title}: {report["counters"][name]}')
+    if not report['enabled']:
+        print('Сбор метрик выключен.')
+
+
+def _execute(user_input, session):
+
+    if not user_input:
+        return True
+
+    if user_input.lower().startswith('insert into'):
+        command = parse_query(user_input)
+        if command is None:
+            return True
+        table_name, rows = command['table'], command['rows']
+        
+        metadata = session.load_metadata()
+        if table_name not in metadata:
+            print(f'Ошибка: Таблица "{table_name}" не существует.')
+            return True
+        
+        if len(rows) == 1:
+            record = insert(metadata, table_name, rows[0])
             if record is None:
-                continue
-            
-            table_data = load_table_data(table_name)
-            
-            if table_data:
-                max_id = max(r.get('ID', 0) for r in table_data)
-                record['ID'] = max_id + 1
-            else:
-                record['ID'] = 1
-            
-            table_data.append(record)
-            save_table_data(table_name, table_data)
-            cache_result.clear()
+                return True
+
+            store_records(session, metadata, table_name, [record])
             msg = (
                 f'Запись с ID={record["ID"]} '
                 f'успешно добавлена в таблицу "{table_name}".'
             )
             print(msg)
-        
-        elif user_input.lower().startswith('select from'):
-            table_name, where_clause = parse_select_command(user_input)
-            if table_name is None:
-                print("Некорректное значение. Попробуйте снова.")
-                continue
-            
-            metadata = load_metadata(METADATA_FILE)
-            if table_name not in metadata:
-                print(f'Ошибка: Таблица "{table_name}" не существует.')
-                continue
-            
-            table_data = load_table_data(table_name)
-            cache_key = (table_name, str(where_clause) if where_clause else None)
-            filtered_data = cache_result(
-                cache_key,
-                lambda: select(table_data, where_clause)
+            return True
+
+        start_time = time.monotonic()
+        records = insert_many(metadata, table_name, rows)
+        if records is None:
+            return True
+
+        first_id = store_records(session, metadata, table_name, records)
+        print(
+            f'Записи с ID={first_id}..{first_id + len(records) - 1} '
+            f'успешно добавлены в таблицу "{table_name}".'
+        )
+        print_batch_report(len(records), time.monotonic() - start_time)
+    
+    elif user_input.lower().startswith('select'):
+        command = parse_query(user_input)
+        if command is None:
+            return True
+        if command['into']:
+            metadata = session.load_metadata()
+            tables = load_query_tables(session, metadata, command)
+            if tables is None:
+                return True
+            export_query(
+                command['table'], tables[0], command, command['into'], tables[1]
             )
-            display_table(filtered_data, metadata, table_name)
+            return True
+
+        result = run_query(command, session, stream=True)
+        if result is None:
+            return True
+        field_names, rows = result
+        try:
+            display_table(rows, field_names)
+        except KeyError as e:
+            print(f'Ошибка: Таблица или столбец {e} не найден.')
+        except ValueError as e:
+            print(f'Ошибка валидации: {e}')
+
+    elif user_input.lower().startswith('explain'):
+        command = parse_query(user_input)
+        if command is None:
+            return True
+        metadata = session.load_metadata()
+        tables = load_query_tables(session, metadata, command['query'])
+        if tables is None:
+            return True
+
+        explain(tables[0], command['query'], tables[1])
+
+    elif user_input.lower().startswith('analyze'):
+        try:
+            args = shlex.split(user_input)
+        except ValueError:
+            print("Некорректное значение. Попробуйте снова.")
+            return True
+        if len(args) != 2:
+            print("Некорректное значение. Попробуйте снова.")
+            return True
+
+        table_name = args[1]
+        metadata = session.load_metadata()
+        if table_name not in metadata:
+            print(f'Ошибка: Таблица "{table_name}" не существует.')
+            return True
+
+        table = session.load_table(table_name, metadata)
+        metadata = analyze_table(metadata, table_name, table)
+        if metadata is not None:
+            session.save_metadata(metadata)
+
+    elif user_input.lower().startswith('export'):
+        command = parse_query(user_input)
+        if command is None:
+            return True
+        table_name = command['table']
+
+        metadata = session.load_metadata()
+        if table_name not in metadata:
+            print(f'Ошибка: Таблица "{table_name}" не существует.')
+            return True
+
+        table = session.load_table(table_name, metadata)
+        export_query(table_name, table, command, command['path'])
+    
+    elif user_input.lower().startswith('update'):
+        command = parse_query(user_input)
+        if command is None:
+            return True
+        table_name, set_clause = command['table'], command['set']
+        where_clause = command['where']
         
-        elif user_input.lower().startswith('update'):
-            table_name, set_clause, where_clause = parse_update_command(user_input)
-            if table_name is None or set_clause is None or where_clause is None:
-                print("Некорректное значение. Попробуйте снова.")
-                continue
-            
-            metadata = load_metadata(METADATA_FILE)
-            if table_name not in metadata:
-                print(f'Ошибка: Таблица "{table_name}" не существует.')
-                continue
-            
-            table_data = load_table_data(table_name)
-            table_data, updated_count, updated_ids = update(
-                table_data, metadata, table_name, set_clause, where_clause
-            )
-            
-            if updated_count > 0:
-                save_table_data(table_name, table_data)
-                cache_result.clear()
-                for record_id in updated_ids:
-                    msg = (
-                        f'Запись с ID={record_id} в таблице "{table_name}" '
-                        f'успешно обновлена.'
-                    )
-                    print(msg)
-            else:
-                print(f'Записи не найдены для обновления в таблице "{table_name}".')
+        metadata = session.load_metadata()
+        if table_name not in metadata:
+            print(f'Ошибка: Таблица "{table_name}" не существует.')
+            return True
+        
+        table = session.writable_table(table_name, metadata)
+        result = update(table, metadata, table_name, set_clause, where_clause)
+        if result is None:
+            return True
+        table, updated_count, updated_ids = result
+        
+        if updated_count > 0:
+            session.log_changes(table_name, [
+                {'op': 'update', 'id': record_id, 'set': set_clause}
+                for record_id in updated_ids
+            ], metadata, table)
+            for record_id in updated_ids:
+                msg = (
+                    f'Запись с ID={record_id} в таблице "{table_name}" '
+                    f'успешно обновлена.'
+                )
+                print(msg)
+        else:
+            print(f'Записи не найдены для обновления в таблице "{table_name}".')
+    
+    elif user_input.lower().startswith('delete from'):
+        command = parse_query(user_input)
+        if command is None:
+            return True
+        table_name, where_clause = command['table'], command['where']
+        
+        metadata = session.load_metadata()
+        if table_name not in metadata:
+            print(f'Ошибка: Таблица "{table_name}" не существует.')
+            return True
         
-        elif user_input.lower().startswith('delete from'):
-            table_name, where_clause = parse_delete_command(user_input)
-            if table_name is None or where_clause is None:
+        table = session.writable_table(table_name, metadata)
+        table, deleted_count, deleted_ids = delete(table, where_clause)
+        
+        if deleted_count > 0:
+            session.log_changes(table_name, [
+                {'op': 'delete', 'id': record_id}
+                for record_id in deleted_ids
+            ], metadata, table)
+            for record_id in deleted_ids:
+                msg = (
+                    f'Запись с ID={record_id} '
+                    f'успешно удалена из таблицы "{table_name}".'
+                )
+                print(msg)
+        else:
+            print(f'Записи не найдены для удаления в таблице "{table_name}".')
+    
+    elif user_input.lower().startswith('import'):
+        try:
+            args = shlex.split(user_input)
+        except ValueError:
+            print("Некорректное значение. Попробуйте снова.")
+            return True
+        if len(args) != 3:
+            print("Некорректное значение. Попробуйте снова.")
+            return True
+
+        table_name, filepath = args[1], args[2]
+        metadata = session.load_metadata()
+        if table_name not in metadata:
+            print(f'Ошибка: Таблица "{table_name}" не существует.')
+            return True
+
+        start_time = time.monotonic()
+        imported = 0
+        try:
+            for numbered_records in read_import_file(
+                filepath, IMPORT_BATCH_SIZE
+            ):
+                records = convert_records(metadata, table_name, numbered_records)
+                if records is None:
+                    break
+                store_records(session, metadata, table_name, records)
+                imported += len(records)
+        except FileNotFoundError:
+            print(f'Ошибка: Файл "{filepath}" не найден.')
+        except ValueError as e:
+            print(f'Ошибка импорта: {e}')
+
+        print(f'Импортировано записей в таблицу "{table_name}": {imported}.')
+        print_batch_report(imported, time.monotonic() - start_time)
+
+    elif user_input.lower().startswith('info'):
+        try:
+            args = shlex.split(user_input)
+            if len(args) < 2:
                 print("Некорректное значение. Попробуйте снова.")
-                continue
+                return True
             
-            metadata = load_metadata(METADATA_FILE)
+            table_name = args[1]
+            metadata = session.load_metadata()
             if table_name not in metadata:
                 print(f'Ошибка: Таблица "{table_name}" не существует.')
-                continue
-            
-            table_data = load_table_data(table_name)
-            table_data, deleted_count, deleted_ids = delete(table_data, where_clause)
-            
-            if deleted_count > 0:
-                save_table_data(table_name, table_data)
-                cache_result.clear()
-                for record_id in deleted_ids:
-                    msg = (
-                        f'Запись с ID={record_id} '
-                        f'успешно удалена из таблицы "{table_name}".'
-                    )
-                    print(msg)
-            else:
-                print(f'Записи не найдены для удаления в таблице "{table_name}".')
-        
-        elif user_input.lower().startswith('info'):
+                return True
+            table = session.load_table(table_name, metadata)
+            info(metadata, table_name, table)
+        except ValueError:
+            print("Некорректное значение. Попробуйте снова.")
+            return True
+    
+    elif user_input.lower() == 'cache_stats':
+        stats = query_cache.stats()
+        print(f"Записей в кэше запросов: {stats['entries']}")
+        print(f"Объём: {stats['bytes']} байт")
+        print(f"Попадания: {stats['hits']}")
+        print(f"Промахи: {stats['misses']}")
+        print(f"Вытеснения: {stats['evictions']}")
+
+    elif user_input.lower().startswith('stats'):
+        args = user_input.split()
+        action = args[1].lower() if len(args) > 1 else None
+        if action is None and len(args) == 1:
+            print_metrics()
+        elif action == 'on' and len(args) == 2:
+            metrics.configure_metrics(True)
+            print('Сбор метрик включён.')
+        elif action == 'off' and len(args) == 2:
+            metrics.configure_metrics(False)
+            print('Сбор метрик выключен.')
+        elif action == 'reset' and len(args) == 2:
+            metrics.reset()
+            print('Метрики сброшены.')
+        elif action == 'save' and len(args) == 3:
             try:
-                args = shlex.split(user_input)
-                if len(args) < 2:
-                    print("Некорректное значение. Попробуйте снова.")
-                    continue
-                
-                table_name = args[1]
-                metadata = load_metadata(METADATA_FILE)
-                table_data = load_table_data(table_name)
-                info(metadata, table_name, table_data)
-            except ValueError:
+                metrics.save(args[2])
+            except OSError as e:
+                print(f'Ошибка: Не удалось записать "{args[2]}": {e}')
+                return True
+            print(f'Метрики записаны в "{args[2]}".')
+        else:
+            print("Некорректное значение. Попробуйте снова.")
+
+    elif user_input.lower().startswith('profile'):
+        statement = user_input[len('profile'):].strip()
+        if not statement:
+            print("Некорректное значение. Попробуйте снова.")
+            return True
+        keep_running, report = metrics.profile(
+            lambda: execute(statement, session)
+        )
+        print(report)
+        return keep_running
+
+    elif user_input.lower() == 'flush':
+        if session.in_transaction:
+            print(
+                'Ошибка: Внутри транзакции изменения записываются '
+                'командой commit.'
+            )
+        else:
+            session.commit()
+            print('Изменения записаны на диск.')
+
+    elif user_input.lower() == 'begin':
+        if session.begin():
+            print('Транзакция начата.')
+        else:
+            print('Ошибка: Транзакция уже начата.')
+
+    elif user_input.lower() == 'commit':
+        if session.commit_transaction():
+            print('Транзакция зафиксирована.')
+        else:
+            print('Ошибка: Нет активной транзакции.')
+
+    elif user_input.lower() == 'rollback':
+        if session.rollback():
+            print('Транзакция отменена.')
+        else:
+            print('Ошибка: Нет активной транзакции.')
+
+    elif user_input.lower() == 'exit':
+        return False
+    
+    elif user_input.lower() == 'help':
+        print_help()
+    
+    elif user_input.lower().startswith('create_table'):
+        try:
+            args = shlex.split(user_input)
+            if len(args) < 3:
                 print("Некорректное значение. Попробуйте снова.")
-                continue
-        
-        elif user_input.lower() == 'exit':
-            break
-        
-        elif user_input.lower() == 'help':
-            print_help()
-        
-        elif user_input.lower().startswith('create_table'):
-            try:
-                args = shlex.split(user_input)
-                if len(args) < 3:
-                    print("Некорректное значение. Попробуйте снова.")
-                    continue
+                return True
 
-                table_name = args[1]
-                columns = args[2:]
+            table_name = args[1]
+            columns = args[2:]
 
-                metadata = load_metadata(METADATA_FILE)
-                old_metadata = metadata.copy()
-                metadata = create_table(metadata, table_name, columns)
+            metadata = session.load_metadata()
+            old_metadata = metadata.copy()
+            metadata = create_table(metadata, table_name, columns)
 
-                if metadata != old_metadata:
-                    save_metadata(METADATA_FILE, metadata)
-            except ValueError:
+            if metadata is not None and metadata != old_metadata:
+                session.save_metadata(metadata)
+        except ValueError:
+            print("Некорректное значение. Попробуйте снова.")
+            return True
+    
+    elif user_input.lower().startswith('create_index'):
+        if session.in_transaction:
+            print(TRANSACTION_DDL_ERROR)
+            return True
+        try:
+            args = shlex.split(user_input)
+            if len(args) not in (3, 4):
                 print("Некорректное значение. Попробуйте снова.")
-                continue
-        
-        elif user_input.lower() == 'list_tables':
-            metadata = load_metadata(METADATA_FILE)
-            tables = list_tables(metadata)
+                return True
 
-            if tables:
-                for table in tables:
-                    print(f"- {table}")
-        
-        elif user_input.lower().startswith('drop_table'):
-            try:
-                args = shlex.split(user_input)
-                if len(args) < 2:
-                    print("Некорректное значение. Попробуйте снова.")
-                    continue
-
-                table_name = args[1]
-                metadata = load_metadata(METADATA_FILE)
-                old_metadata = metadata.copy()
-                metadata = drop_table(metadata, table_name)
-
-                if metadata != old_metadata:
-                    save_metadata(METADATA_FILE, metadata)
-            except ValueError:
+            table_name, column = args[1], args[2]
+            kind = args[3].lower() if len(args) == 4 else 'hash'
+            # Индекс строится по файлам, поэтому отложенные изменения
+            # записываются заранее.
+            session.commit()
+            metadata = session.load_metadata()
+            old_metadata = copy.deepcopy(metadata)
+            metadata = create_index(metadata, table_name, column, kind)
+
+            if metadata != old_metadata:
+                session.save_metadata(metadata)
+                session.commit()
+                rebuild_table_indexes(table_name, metadata)
+        except ValueError:
+            print("Некорректное значение. Попробуйте снова.")
+            return True
+    
+    elif user_input.lower().startswith('set_format'):
+        if session.in_transaction:
+            print(TRANSACTION_DDL_ERROR)
+            return True
+        try:
+            args = shlex.split(user_input)
+            if len(args) != 3:
                 print("Некорректное значение. Попробуйте снова.")
-                continue
-        
-        else:
-            print("Функции нет. Попробуйте снова.")
+                return True
+
+            table_name, table_format = args[1], args[2].lower()
+            session.commit()
+            metadata = session.load_metadata()
+            if table_name not in metadata:
+                print(f'Ошибка: Таблица "{table_name}" не существует.')
+                return True
+
+            old_format = get_table_format(metadata, table_name)
+            metadata = set_table_format(metadata, table_name, table_format)
+
+            if get_table_format(metadata, table_name) != old_format:
+                # Новый снимок пишется до метаданных, старый удаляется после.
+                convert_table_data(table_name, metadata, old_format)
+                session.save_metadata(metadata)
+                session.commit()
+                remove_old_table_data(table_name, old_format)
+        except ValueError:
+            print("Некорректное значение. Попробуйте снова.")
+            return True
+    
+    elif user_input.lower() == 'list_tables':
+        metadata = session.load_metadata()
+        tables = list_tables(metadata)
+
+        if tables:
+            for table in tables:
+                print(f"- {table}")
+    
+    elif user_input.lower().startswith('drop_table'):
+        if session.in_transaction:
+            print(TRANSACTION_DDL_ERROR)
+            return True
+        try:
+            args = shlex.split(user_input)
+            if len(args) < 2:
+                print("Некорректное значение. Попробуйте снова.")
+                return True
+
+            table_name = args[1]
+            metadata = session.load_metadata()
+            old_metadata = metadata.copy()
+            metadata = drop_table(metadata, table_name)
+
+            if metadata != old_metadata:
+                session.save_metadata(metadata)
+                session.commit()
+                delete_table_data(table_name)
+                query_cache.invalidate_table(table_name)
+        except ValueError:
+            print("Некорректное значение. Попробуйте снова.")
+            return True
+    
+    elif user_input.lower().startswith('alter table'):
+        if session.in_transaction:
+            print(TRANSACTION_DDL_ERROR)
+            return True
+        command = parse_alter(user_input)
+        if command is None:
+            print("Некорректное значение. Попробуйте снова.")
+            return True
+
+        # Отложенные строки записываются при прежней версии схемы.
+        session.commit()
+        metadata = session.load_metadata()
+        old_metadata = copy.deepcopy(metadata)
+        metadata = alter_table(metadata, command)
+
+        if metadata is not None and metadata != old_metadata:
+            # Меняются только метаданные: строки приводятся к новой схеме
+            # при чтении и перезаписываются при уплотнении журнала.
+            session.save_metadata(metadata)
+            session.commit()
+            query_cache.invalidate_table(command['table'])
+    
+    else:
+        print("Функции нет. Попробуйте снова.")
+
+    return True
+
+
+def run(
+    metrics_file=None,
+    durability=DEFAULT_DURABILITY,
+    flush_every=FLUSH_EVERY,
+    flush_interval_ms=FLUSH_INTERVAL_MS,
+):
+    # prompt нужен только интерактивному режиму и загружается здесь.
+    import prompt
+
+    print_help()
+    print()
+
+    if metrics_file:
+        metrics.configure_metrics(True)
+    session = Session(
+        durability=durability,
+        flush_every=flush_every,
+        flush_interval_ms=flush_interval_ms,
+    )
+    if session.recovered:
+        print('Восстановлена зафиксированная транзакция, прерванная сбоем.')
+    if durability == 'group':
+        print(
+            f'Режим записи group: изменения записываются на диск каждые '
+            f'{flush_every} изменений, через {flush_interval_ms} мс, '
+            f'командой flush и при выходе. При сбое последние изменения '
+            f'могут быть потеряны.'
+        )
+    try:
+        while True:
+            user_input = prompt.string(">>> Введите команду: ").strip()
+            # Фоновая запись не выполняется посреди команды.
+            with session.lock:
+                keep_running = execute(user_input, session)
+                session.statement_done()
+            if not keep_running:
+                break
+    finally:
+        if session.close():
+            print('Незафиксированная транзакция отменена.')
+    if metrics_file:
+        metrics.save(metrics_file)
+
+
+def run_batch(statements, commit_every=BATCH_COMMIT_EVERY, metrics_file=None):
+    # Без приглашения и справки; подтверждения не запрашиваются,
+    # изменения записываются группами.
+    set_auto_confirm(True)
+    if metrics_file:
+        metrics.configure_metrics(True)
+    session = Session(batch=True, commit_every=commit_every)
+    try:
+        for statement in statements:
+            keep_running = execute(statement, session)
+            session.statement_done()
+            if not keep_running:
+                break
+    finally:
+        if session.close():
+            print('Незафиксированная транзакция отменена.')
+        if metrics_file:
+            metrics.save(metrics_file)
@@ -0,0 +1,183 @@
+import bisect
+
+INDEX_KINDS = ('hash', 'sorted')
+
+
+class HashIndex:
+    kind = 'hash'
+
+    def __init__(self, column):
+        self.column = column
+        self.entries = {}
+
+    def add(self, value, pos):
+        self.entries.setdefault(value, []).append(pos)
+
+    def remove(self, value, pos):
+        positions = self.entries.get(value)
+        if not positions or pos not in positions:
+            return
+        positions.remove(pos)
+        if not positions:
+            del self.entries[value]
+
+    def lookup(self, value):
+        return self.entries.get(value, [])
+
+    def to_json(self):
+        return {
+            'kind': self.kind,
+            'entries': [
+                [value, positions] for value, positions in self.entries.items()
+            ],
+        }
+
+    def load_json(self, data):
+        self.entries = {value: positions for value, positions in data['entries']}
+
+
+class SortedIndex:
+    kind = 'sorted'
+
+    def __init__(self, column):
+        self.column = column
+        self.keys = []
+        self.positions = []
+
+    def add(self, value, pos):
+        i = bisect.bisect_right(self.keys, value)
+        self.keys.insert(i, value)
+        self.positions.insert(i, pos)
+
+    def remove(self, value, pos):
+        lo = bisect.bisect_left(self.keys, value)
+        hi = bisect.bisect_right(self.keys, value)
+        for i in range(lo, hi):
+            if self.positions[i] == pos:
+                del self.keys[i]
+                del self.positions[i]
+                return
+
+    def lookup(self, value):
+        lo = bisect.bisect_left(self.keys, value)
+        hi = bisect.bisect_right(self.keys, value)
+        return self.positions[lo:hi]
+
+    def range(self, low=None, high=None, include_low=True, include_high=True):
+        if low is None:
+            lo = 0
+        elif include_low:
+            lo = bisect.bisect_left(self.keys, low)
+        else:
+            lo = bisect.bisect_right(self.keys, low)
+
+        if high is None:
+            hi = len(self.keys)
+        elif include_high:
+            hi = bisect.bisect_right(self.keys, high)
+        else:
+            hi = bisect.bisect_left(self.keys, high)
+
+        return self.positions[lo:hi]
+
+    def to_json(self):
+        return {
+            'kind': self.kind,
+            'keys': self.keys,
+            'positions': self.positions,
+        }
+
+    def load_json(self, data):
+        self.keys = data['keys']
+        self.positions = data['positions']
+
+
+class PrimaryIndex:
+    kind = 'primary'
+
+    def __init__(self, column):
+        self.column = column
+        self.entries = {}
+
+    def add(self, value, pos):
+        self.entries[value] = pos
+
+    def remove(self, value, pos):
+        if self.entries.get(value) == pos:
+            del self.entries[value]
+
+    def lookup(self, value):
+        pos = self.entries.get(value)
+        return [] if pos is None else [pos]
+
+    def to_json(self):
+        return {'kind': self.kind, 'entries': list(self.entries.items())}
+
+    def load_json(self, data):
+        self.entries = {value: pos for value, pos in data['entries']}
+
+
+def new_index(column, kind):
+    if kind == 'primary':
+        return PrimaryIndex(column)
+    if kind == 'sorted':
+        return SortedIndex(column)
+    return HashIndex(column)
+
+
+def build_index(column, kind, pairs):
+    index = new_index(column, kind)
+    if kind == 'sorted':
+        ordered = sorted((value, pos) for pos, value in pairs)
+        index.keys = [value for value, _ in ordered]
+        index.positions = [pos for _, pos in ordered]
+        return index
+
+    for pos, value in pairs:
+        index.add(value, pos)
+    return index
+
+
+def build_indexes(table, index_specs, renumber=False):
+    positions = table.positions()
+    indexes = {}
+    for column, kind in (index_specs or {}).items():
+        store = table.stores[column]
+        values = (store.get(pos) for pos in positions)
+        if renumber:
+            pairs = enumerate(values)
+        else:
+            pairs = zip(positions, values)
+        indexes[column] = build_index(column, kind, pairs)
+    return indexes
+
+
+def index_record(indexes, record, pos):
+    for column, index in indexes.items():
+        if column in record:
+            index.add(record[column], pos)
+
+
+def reindex_record(indexes, old_record, new_record, pos):
+    for column, index in indexes.items():
+        old_value = old_record.get(column)
+        new_value = new_record.get(column)
+        if old_value != new_value:
+            index.remove(old_value, pos)
+            index.add(new_value, pos)
+
+
+def indexes_to_json(indexes):
+    return {column: index.to_json() for column, index in indexes.items()}
+
+
+def indexes_from_json(data, index_specs):
+    indexes = {}
+    for column, kind in (index_specs or {}).items():
+        stored = data.get(column)
+        if stored is None or stored.get('kind') != kind:
+            return None
+        index = new_index(column, kind)
+        index.load_json(stored)
+        indexes[column] = index
+    return indexes
@@ -0,0 +1,258 @@
+import json
+import math
+import os
+
+from src.primitive_db.constants import DATA_DIR, JOIN_SPILL_ROWS
+from src.primitive_db.predicate import (
+    conjuncts,
+    referenced_columns,
+    rename_columns,
+)
+
+
+def joined_columns(left, right):
+    return [
+        (f'{table.name}.{col_name}', col_type)
+        for table in (left, right)
+        for col_name, col_type in table.columns
+    ]
+
+
+def _split_name(name):
+    table_name, column = name.split('.', 1)
+    return table_name, column
+
+
+def resolve_column(left, right, name):
+    if '.' in name:
+        table_name, column = _split_name(name)
+        for table in (left, right):
+            if table.name == table_name and column in table.stores:
+                return name
+        raise KeyError(name)
+
+    owners = [table for table in (left, right) if name in table.stores]
+    if not owners:
+        raise KeyError(name)
+    if len(owners) > 1:
+        raise ValueError(
+            f'столбец {name} есть в обеих таблицах, укажите имя таблицы'
+        )
+    return f'{owners[0].name}.{name}'
+
+
+def qualify_command(left, right, command):
+    if left.name == right.name:
+        raise ValueError('соединение таблицы с самой собой не поддерживается')
+
+    def resolve(name):
+        return resolve_column(left, right, name)
+
+    def resolve_item(item):
+        if item[0] == 'column':
+            return ('column', resolve(item[1]))
+        if item[2] is None:
+            return item
+        return ('agg', item[1], resolve(item[2]))
+
+    qualified = dict(command)
+    if command['columns'] is not None:
+        qualified['columns'] = [resolve_item(item) for item in command['columns']]
+    qualified['group_by'] = [resolve(name) for name in command['group_by']]
+    qualified['order_by'] = [
+        (resolve_item(item), descending)
+        for item, descending in command['order_by']
+    ]
+    if command['where'] is not None:
+        mapping = {
+            name: resolve(name)
+            for name in referenced_columns(command['where'])
+        }
+        qualified['where'] = rename_columns(command['where'], mapping)
+
+    first, second = (resolve(name) for name in command['join']['on'])
+    if _split_name(first)[0] != left.name:
+        first, second = second, first
+    if _split_name(first)[0] != left.name or _split_name(second)[0] != right.name:
+        raise ValueError('условие соединения должно связывать обе таблицы')
+
+    left_column, right_column = _split_name(first)[1], _split_name(second)[1]
+    if dict(left.columns)[left_column] != dict(right.columns)[right_column]:
+        raise ValueError(f'типы столбцов {first} и {second} не совпадают')
+    qualified['on'] = (left_column, right_column)
+    return qualified
+
+
+def _combine(conditions):
+    if not conditions:
+        return None
+    node = conditions[0]
+    for condition in conditions[1:]:
+        node = ('and', node, condition)
+    return node
+
+
+def split_where(left, right, where_clause):
+    # Условия на одну таблицу проверяются до соединения, при её просмотре;
+    # остальные - на уже соединённых строках.
+    sides = {left.name: [], right.name: []}
+    residual = []
+    for condition in conjuncts(where_clause):
+        tables = {
+            _split_name(name)[0] for name in referenced_columns(condition)
+        }
+        if len(tables) == 1:
+            sides[tables.pop()].append(condition)
+        else:
+            residual.append(condition)
+
+    side_clauses = []
+    for table in (left, right):
+        clause = _combine(sides[table.name])
+        if clause is not None:
+            mapping = {
+                f'{table.name}.{col_name}': col_name
+                for col_name in table.column_names()
+            }
+            clause = rename_columns(clause, mapping)
+        side_clauses.append(clause)
+    return side_clauses[0], side_clauses[1], _combine(residual)
+
+
+def join_strategy(left, right):
+    # Если по столбцу соединения есть индекс, он заменяет хеш-таблицу:
+    # вторая сторона просматривается, а пары ищутся в индексе.
+    left_index = left['table'].indexes.get(left['column'])
+    right_index = right['table'].indexes.get(right['column'])
+    if right_index is not None and (
+        left_index is None or left['rows'] <= right['rows']
+    ):
+        return 'index', right
+    if left_index is not None:
+        return 'index', left
+    if left['rows'] <= right['rows']:
+        return 'hash', left
+    return 'hash', right
+
+
+def join_positions(left, right, matches_left=None, matches_right=None):
+    strategy, side = join_strategy(left, right)
+    inner_is_left = side is left
+    other = right if inner_is_left else left
+    if strategy == 'index':
+        matches = matches_left if inner_is_left else matches_right
+        return _index_join(other, side, matches, inner_is_left)
+    return _hash_join(side, other, inner_is_left)
+
+
+def _pair(inner_pos, outer_pos, inner_is_left):
+    if inner_is_left:
+        return inner_pos, outer_pos
+    return outer_pos, inner_pos
+
+
+def _index_join(outer, inner, matches, inner_is_left):
+    index = inner['table'].indexes[inner['column']]
+    get = outer['table'].stores[outer['column']].get
+    for pos in outer['positions']:
+        found = index.lookup(get(pos))
+        if found and matches is not None:
+            found = matches(found)
+        for inner_pos in found:
+            yield _pair(inner_pos, pos, inner_is_left)
+
+
+def _hash_join(build, probe, build_is_left):
+    build_get = build['table'].stores[build['column']].get
+    probe_get = probe['table'].stores[probe['column']].get
+
+    buckets = {}
+    stored = 0
+    positions = iter(build['positions'])
+    for pos in positions:
+        buckets.setdefault(build_get(pos), []).append(pos)
+        stored += 1
+        if stored >= JOIN_SPILL_ROWS:
+            yield from _spilled_join(
+                build, probe, build_is_left, buckets, positions
+            )
+            return
+
+    for pos in probe['positions']:
+        for build_pos in buckets.get(probe_get(pos), ()):
+            yield _pair(build_pos, pos, build_is_left)
+
+
+def _write_partitions(files, items):
+    count = len(files)
+    for key, pos in items:
+        files[hash(key) % count].write(json.dumps([key, pos]) + '\n')
+
+
+def _spilled_join(build, probe, build_is_left, buckets, rest):
+    # Хеш-таблица не помещается в память: обе стороны раскладываются по
+    # разделам во временных файлах, и разделы соединяются по одному.
+    import tempfile
+
+    partitions = max(2, 2 * math.ceil(len(build['table']) / JOIN_SPILL_ROWS))
+    build_get = build['table'].stores[build['column']].get
+    probe_get = probe['table'].stores[probe['column']].get
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix='join-', dir=DATA_DIR) as tmp_dir:
+        build_paths = [
+            os.path.join(tmp_dir, f'build-{i}.jsonl') for i in range(partitions)
+        ]
+        probe_paths = [
+            os.path.join(tmp_dir, f'probe-{i}.jsonl') for i in range(partitions)
+        ]
+
+        files = [open(path, 'w', encoding='utf-8') for path in build_paths]
+        try:
+            _write_partitions(files, (
+                (key, pos)
+                for key, positions in buckets.items()
+                for pos in positions
+            ))
+            buckets.clear()
+            _write_partitions(files, ((build_get(pos), pos) for pos in rest))
+        finally:
+            for f in files:
+                f.close()
+
+        files = [open(path, 'w', encoding='utf-8') for path in probe_paths]
+        try:
+            _write_partitions(
+                files, ((probe_get(pos), pos) for pos in probe['positions'])
+            )
+        finally:
+            for f in files:
+                f.close()
+
+        for build_path, probe_path in zip(build_paths, probe_paths):
+            partition = {}
+            with open(build_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    key, pos = json.loads(line)
+                    partition.setdefault(key, []).append(pos)
+            with open(probe_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    key, pos = json.loads(line)
+                    for build_pos in partition.get(key, ()):
+                        yield _pair(build_pos, pos, build_is_left)
+
+
+def joined_rows(left, right, pairs):
+    left_stores = [
+        (f'{left.name}.{col_name}', store)
+        for col_name, store in left.stores.items()
+    ]
+    right_stores = [
+        (f'{right.name}.{col_name}', store)
+        for col_name, store in right.stores.items()
+    ]
+    for left_pos, right_pos in pairs:
+        row = {label: store.get(left_pos) for label, store in left_stores}
+        for label, store in right_stores:
+            row[label] = store.get(right_pos)
+        yield row
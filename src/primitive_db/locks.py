@@ -0,0 +1,57 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Без fcntl (Windows) блокировки между процессами не поддерживаются.
+    fcntl = None
+
+# Блокировки, уже взятые текущим потоком: повторный вход в ту же блокировку
+# не открывает файл заново, иначе flock заблокировал бы сам себя.
+_held = threading.local()
+
+
+def _held_locks():
+    locks = getattr(_held, 'locks', None)
+    if locks is None:
+        locks = _held.locks = {}
+    return locks
+
+
+@contextmanager
+def file_lock(filepath, exclusive=False):
+    if fcntl is None:
+        yield
+        return
+
+    locks = _held_locks()
+    held = locks.get(filepath)
+    if held is not None:
+        upgrade = exclusive and not held['exclusive']
+        if upgrade:
+            fcntl.flock(held['fd'], fcntl.LOCK_EX)
+            held['exclusive'] = True
+        try:
+            yield
+        finally:
+            if upgrade:
+                fcntl.flock(held['fd'], fcntl.LOCK_SH)
+                held['exclusive'] = False
+        return
+
+    directory = os.path.dirname(filepath)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd = os.open(filepath, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        locks[filepath] = {'fd': fd, 'exclusive': exclusive}
+        try:
+            yield
+        finally:
+            del locks[filepath]
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
@@ -1,11 +1,236 @@
 #!/usr/bin/env python3
 
-from src.primitive_db.engine import run
+import argparse
+import sys
 
+from src.primitive_db.constants import (
+    BATCH_COMMIT_EVERY,
+    BENCH_OUTPUT,
+    BENCH_REPEAT,
+    BENCH_SIZES,
+    DEFAULT_DURABILITY,
+    DURABILITY_MODES,
+    FLUSH_EVERY,
+    FLUSH_INTERVAL_MS,
+    SERVER_HOST,
+    SERVER_PORT,
+    STARTUP_IMPORT_BUDGET_MS,
+    TABLE_FORMATS,
+)
+from src.primitive_db.engine import run, run_batch
+from src.primitive_db.parallel import configure_parallel
+from src.primitive_db.parser import iter_statements
+from src.primitive_db.vectorized import configure_vectorized
 
-def main():
-    run()
+
+def _add_scan_options(parser):
+    parser.add_argument(
+        '--workers', type=int,
+        help='число процессов параллельного просмотра; 1 - без параллельного '
+             'просмотра (по умолчанию по числу ядер)',
+    )
+    parser.add_argument(
+        '--no-numpy', action='store_true',
+        help='не использовать NumPy: условия проверяются построчно',
+    )
+
+
+def _configure_scans(args):
+    if args.workers is not None:
+        configure_parallel(args.workers)
+    if args.no_numpy:
+        configure_vectorized(False)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='database',
+        description='Примитивная база данных. Без аргументов запускается '
+                    'интерактивный режим; если ввод перенаправлен, команды '
+                    'читаются из него. "database serve" запускает сервер, '
+                    '"database bench" - замеры производительности.',
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument(
+        '-f', '--file',
+        help='выполнить команды из файла ("-" - из стандартного ввода)',
+    )
+    source.add_argument(
+        '-c', '--command', action='append',
+        help='выполнить команду; можно указать несколько раз',
+    )
+    parser.add_argument(
+        '--commit-every', type=int, default=BATCH_COMMIT_EVERY,
+        help='записывать изменения на диск каждые N команд '
+             f'(по умолчанию {BATCH_COMMIT_EVERY})',
+    )
+    parser.add_argument(
+        '--durability', choices=DURABILITY_MODES, default=DEFAULT_DURABILITY,
+        help='интерактивный режим: sync - каждое изменение сразу на диск, '
+             'group - изменения копятся в памяти и записываются группами '
+             f'(по умолчанию {DEFAULT_DURABILITY})',
+    )
+    parser.add_argument(
+        '--flush-every', type=int, default=FLUSH_EVERY,
+        help='в режиме group записывать после N изменений '
+             f'(по умолчанию {FLUSH_EVERY})',
+    )
+    parser.add_argument(
+        '--flush-interval', type=int, default=FLUSH_INTERVAL_MS,
+        help='в режиме group записывать не позже чем через N мс после '
+             f'первого незаписанного изменения (по умолчанию {FLUSH_INTERVAL_MS})',
+    )
+    parser.add_argument(
+        '--metrics', metavar='FILE',
+        help='собирать задержки и счётчики и записать их в FILE (JSON)',
+    )
+    _add_scan_options(parser)
+    return parser.parse_args(argv)
+
+
+def parse_serve_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='database serve',
+        description='Сервер базы данных: таблицы остаются в памяти, команды '
+                    'принимаются по сокету строками JSON.',
+    )
+    parser.add_argument(
+        '--host', default=SERVER_HOST,
+        help=f'адрес для TCP (по умолчанию {SERVER_HOST})',
+    )
+    parser.add_argument(
+        '--port', type=int, default=SERVER_PORT,
+        help=f'порт для TCP (по умолчанию {SERVER_PORT})',
+    )
+    parser.add_argument(
+        '--socket',
+        help='слушать Unix-сокет с этим путём вместо TCP',
+    )
+    _add_scan_options(parser)
+    return parser.parse_args(argv)
+
+
+def _comma_list(convert):
+    def parse(text):
+        try:
+            return [convert(item) for item in text.split(',') if item]
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'некорректный список: {text}')
+    return parse
+
+
+def parse_bench_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='database bench',
+        description='Замеры основных операций на синтетических таблицах. '
+                    'Результаты записываются в JSON для сравнения прогонов.',
+    )
+    parser.add_argument(
+        '--sizes', type=_comma_list(int), default=list(BENCH_SIZES),
+        help='размеры таблиц через запятую (по умолчанию '
+             f'{",".join(map(str, BENCH_SIZES))})',
+    )
+    parser.add_argument(
+        '--formats', type=_comma_list(str), default=list(TABLE_FORMATS),
+        help='форматы хранения через запятую (по умолчанию '
+             f'{",".join(TABLE_FORMATS)})',
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=BENCH_REPEAT,
+        help=f'число повторов каждого замера (по умолчанию {BENCH_REPEAT})',
+    )
+    parser.add_argument(
+        '-o', '--output', default=BENCH_OUTPUT,
+        help=f'файл для результатов (по умолчанию {BENCH_OUTPUT})',
+    )
+    parser.add_argument(
+        '--compare',
+        help='файл результатов прежнего прогона для сравнения',
+    )
+    parser.add_argument(
+        '--startup-check', action='store_true',
+        help='только проверить время импорта при запуске (-X importtime) '
+             'и что тяжёлые модули не загружаются заранее',
+    )
+    parser.add_argument(
+        '--budget', type=float, default=STARTUP_IMPORT_BUDGET_MS,
+        help='бюджет времени импорта для --startup-check, мс '
+             f'(по умолчанию {STARTUP_IMPORT_BUDGET_MS})',
+    )
+    parser.add_argument(
+        '--scan-check', action='store_true',
+        help='только проверить, что параллельный просмотр находит те же '
+             'строки, что и последовательный',
+    )
+    _add_scan_options(parser)
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.formats if name not in TABLE_FORMATS]
+    if unknown:
+        parser.error(f'неизвестный формат: {", ".join(unknown)}')
+    if any(size < 1 for size in args.sizes) or args.repeat < 1:
+        parser.error('размеры и число повторов должны быть положительными')
+    return args
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == 'serve':
+        # Сервер загружается только по требованию: asyncio не нужен
+        # интерактивному и пакетному режимам.
+        from src.primitive_db.server import run_server
+
+        args = parse_serve_args(argv[1:])
+        _configure_scans(args)
+        run_server(args.host, args.port, args.socket)
+        return
+    if argv and argv[0] == 'bench':
+        from src.primitive_db.bench import (
+            check_parallel_scan,
+            check_startup,
+            run_bench,
+        )
+
+        args = parse_bench_args(argv[1:])
+        _configure_scans(args)
+        if args.scan_check:
+            if not check_parallel_scan():
+                sys.exit(1)
+            return
+        if args.startup_check:
+            if not check_startup(args.budget, args.repeat):
+                sys.exit(1)
+            return
+        if not run_bench(
+            args.sizes, args.formats, args.repeat, args.output, args.compare
+        ):
+            sys.exit(1)
+        return
+
+    args = parse_args(argv)
+    _configure_scans(args)
+    commit_every = max(1, args.commit_every)
+
+    if args.command:
+        run_batch(iter_statements(args.command), commit_every, args.metrics)
+    elif args.file and args.file != '-':
+        try:
+            script = open(args.file, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            print(f'Ошибка: Файл "{args.file}" не найден.')
+            sys.exit(1)
+        with script:
+            run_batch(iter_statements(script), commit_every, args.metrics)
+    elif args.file == '-' or not sys.stdin.isatty():
+        run_batch(iter_statements(sys.stdin), commit_every, args.metrics)
+    else:
+        run(
+            args.metrics,
+            args.durability,
+            max(1, args.flush_every),
+            max(0, args.flush_interval),
+        )
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
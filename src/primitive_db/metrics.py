@@ -0,0 +1,136 @@
+import json
+import math
+import time
+from contextlib import contextmanager
+
+from src.primitive_db.constants import (
+    METRICS_BUCKETS_PER_DOUBLING,
+    PROFILE_TOP_FUNCTIONS,
+)
+
+# Метрики собираются, только если включены (stats on или --metrics):
+# выключенный сбор стоит одной проверки флага на вызов.
+_enabled = False
+_histograms = {}
+_counters = {}
+
+# Процентили задержек в выводе stats.
+PERCENTILES = (50, 95, 99)
+
+COUNTER_NAMES = {
+    'rows_scanned': 'Просмотрено строк',
+    'rows_returned': 'Возвращено строк',
+    'bytes_read': 'Прочитано байт',
+    'bytes_written': 'Записано байт',
+    'table_cache_hits': 'Попадания в кэш таблиц',
+    'table_cache_misses': 'Промахи кэша таблиц',
+    'query_cache_hits': 'Попадания в кэш запросов',
+    'query_cache_misses': 'Промахи кэша запросов',
+}
+
+
+class Histogram:
+    # Логарифмические корзины от микросекунды: точность процентиля
+    # не хуже 2 ** (1 / METRICS_BUCKETS_PER_DOUBLING) при постоянной памяти.
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        bucket = 0
+        if seconds > 1e-6:
+            bucket = int(math.log2(seconds * 1e6) * METRICS_BUCKETS_PER_DOUBLING)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent):
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                upper = 1e-6 * 2 ** ((bucket + 1) / METRICS_BUCKETS_PER_DOUBLING)
+                return min(upper, self.max)
+        return self.max
+
+    def summary(self):
+        result = {'count': self.count, 'total': self.total, 'max': self.max}
+        for percent in PERCENTILES:
+            result[f'p{percent}'] = self.percentile(percent)
+        return result
+
+
+def configure_metrics(enabled):
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled():
+    return _enabled
+
+
+def add(name, value=1):
+    if _enabled:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(operation, seconds):
+    if _enabled:
+        histogram = _histograms.get(operation)
+        if histogram is None:
+            histogram = _histograms[operation] = Histogram()
+        histogram.observe(seconds)
+
+
+@contextmanager
+def timer(operation):
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(operation, time.perf_counter() - start)
+
+
+def reset():
+    _histograms.clear()
+    _counters.clear()
+
+
+def snapshot():
+    return {
+        'enabled': _enabled,
+        'operations': {
+            operation: histogram.summary()
+            for operation, histogram in sorted(_histograms.items())
+        },
+        'counters': {name: _counters.get(name, 0) for name in COUNTER_NAMES},
+    }
+
+
+def save(filepath):
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(), f, ensure_ascii=False, indent=2)
+
+
+def profile(action, top=PROFILE_TOP_FUNCTIONS):
+    # Одна команда выполняется под cProfile; выводятся функции
+    # с наибольшим суммарным временем.
+    import cProfile
+    import io
+    import pstats
+
+    profiler = cProfile.Profile()
+    result = profiler.runcall(action)
+    report = io.StringIO()
+    stats = pstats.Stats(profiler, stream=report)
+    stats.sort_stats('cumulative').print_stats(top)
+    return result, report.getvalue()
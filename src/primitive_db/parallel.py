@@ -0,0 +1,245 @@
+import atexit
+import os
+import weakref
+from array import array
+from functools import partial
+
+from src.primitive_db.binary_format import file_id, map_column, map_file
+from src.primitive_db.constants import (
+    PARALLEL_SCAN_CHUNKS_PER_WORKER,
+    PARALLEL_SCAN_MIN_ROWS,
+)
+from src.primitive_db.predicate import compile_predicate, referenced_columns
+from src.primitive_db.table import Table
+
+# Столбцы, которые ещё ссылаются на файл .bin, процессы сами отображают
+# через mmap по смещениям из каталога файла. Остальные столбцы копируются
+# в разделяемую память; сегменты освобождаются, как только таблица
+# изменится или будет удалена. concurrent.futures и multiprocessing
+# импортируются только при первом параллельном просмотре.
+_pool = None
+_workers = os.cpu_count() or 1
+_exported = {}
+
+# Таблица, уже открытая рабочим процессом, по версии и набору столбцов.
+_attached = {}
+
+_ALIVE = '\0alive'
+
+
+def configure_parallel(workers):
+    global _workers
+    shutdown()
+    _workers = max(1, workers)
+
+
+def worker_count():
+    return _workers
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+    for key in list(_exported):
+        _release(key)
+
+
+atexit.register(shutdown)
+
+
+def _release(key):
+    for shared in _exported.pop(key, {}).values():
+        for shm, _ in shared:
+            shm.close()
+            shm.unlink()
+
+
+def _share(data):
+    from multiprocessing import shared_memory
+
+    view = memoryview(data).cast('B')
+    shm = shared_memory.SharedMemory(create=True, size=max(1, len(view)))
+    shm.buf[:len(view)] = view
+    return shm, len(view)
+
+
+def _export_column(store):
+    if store.type_name == 'str':
+        return [_share(store.starts), _share(store.ends), _share(store.buffer)]
+    return [_share(store.values)]
+
+
+def _mapped_blocks(table, col_names):
+    # Блоки столбцов, которые не менялись после чтения файла, если файл
+    # с тех пор не был заменён.
+    if table.source is None:
+        return None, {}
+    path, source_id, blocks = table.source
+    try:
+        if file_id(os.stat(path)) != source_id:
+            return None, {}
+    except OSError:
+        return None, {}
+    mapped = {
+        col_name: blocks[col_name] for col_name in col_names
+        if col_name in blocks and table.stores[col_name].is_mapped()
+    }
+    return (path, source_id), mapped
+
+
+def _export(table, col_names):
+    key = (table.name, table.version)
+    # Сегменты таблицы с тем же именем, перечитанной с диска, больше не нужны.
+    for old_key in [k for k in _exported if k[0] == table.name and k != key]:
+        _release(old_key)
+
+    source, mapped = _mapped_blocks(table, col_names)
+    shared = [col_name for col_name in col_names if col_name not in mapped]
+    if table.live_count < len(table.alive):
+        shared.append(_ALIVE)
+
+    segments = _exported.get(key)
+    if segments is None and shared:
+        segments = _exported[key] = {}
+        release = partial(_release, key)
+        table.on_change = release
+        weakref.finalize(table, release)
+    for name in shared:
+        if name not in segments:
+            if name == _ALIVE:
+                segments[name] = [_share(table.alive)]
+            else:
+                segments[name] = _export_column(table.stores[name])
+
+    return {
+        'key': key,
+        'rows': len(table.alive),
+        'columns': [
+            (col_name, col_type) for col_name, col_type in table.columns
+            if col_name in col_names
+        ],
+        'file': source if mapped else None,
+        'blocks': mapped,
+        'segments': {
+            name: [(shm.name, size) for shm, size in segments[name]]
+            for name in shared
+        },
+    }
+
+
+def _attach_segment(name, size):
+    # Сегмент удаляет создавший его родительский процесс.
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, shm.buf[:size]
+
+
+def _attach(spec):
+    # Запросы к одной версии таблицы могут использовать разные столбцы.
+    key = (spec['key'], tuple(col_name for col_name, _ in spec['columns']))
+    cached = _attached.get(key)
+    if cached is not None:
+        return cached[1]
+
+    stale = [shms for shms, _ in _attached.values()]
+    _attached.clear()
+    for shms in stale:
+        for shm in shms:
+            shm.close()
+
+    file_view = None
+    if spec['file'] is not None:
+        path, source_id = spec['file']
+        try:
+            file_view, current_id = map_file(path)
+        except FileNotFoundError:
+            return None
+        # Файл заменили после того, как родитель его прочитал.
+        if current_id != tuple(source_id):
+            return None
+
+    shms = []
+
+    def view(name, i=0):
+        shm, buf = _attach_segment(*spec['segments'][name][i])
+        shms.append(shm)
+        return buf
+
+    table = Table(spec['key'][0], spec['columns'])
+    for col_name, col_type in spec['columns']:
+        store = table.stores[col_name]
+        if col_name in spec['blocks']:
+            map_column(store, file_view, spec['blocks'][col_name])
+        elif col_type == 'int':
+            store.values = view(col_name).cast('q')
+        elif col_type == 'bool':
+            store.values = view(col_name)
+        else:
+            store.starts = view(col_name, 0).cast('q')
+            store.ends = view(col_name, 1).cast('q')
+            store.buffer = view(col_name, 2)
+    # Без сегмента alive все строки таблицы живые.
+    table.alive = view(_ALIVE) if _ALIVE in spec['segments'] else None
+    _attached[key] = (shms, table)
+    return table
+
+
+def _scan_chunk(spec, where_clause, start, stop):
+    table = _attach(spec)
+    if table is None:
+        return None
+    alive = table.alive
+    if alive is None:
+        positions = range(start, stop)
+    else:
+        positions = [pos for pos in range(start, stop) if alive[pos]]
+    matches = compile_predicate(table, where_clause)
+    return array('q', matches(positions)).tobytes()
+
+
+def _get_pool():
+    global _pool
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import resource_tracker
+
+    if _pool is None:
+        # Процессы должны унаследовать общий учёт сегментов: иначе свой учёт
+        # рабочего процесса сочтёт удалённые родителем сегменты утёкшими.
+        resource_tracker.ensure_running()
+        _pool = ProcessPoolExecutor(max_workers=_workers)
+    return _pool
+
+
+def should_scan_in_parallel(table):
+    return _workers > 1 and len(table) >= PARALLEL_SCAN_MIN_ROWS
+
+
+def parallel_scan(table, where_clause):
+    # Таблица делится на участки, условие проверяется в рабочих процессах,
+    # а найденные позиции собираются по порядку участков.
+    from concurrent.futures.process import BrokenProcessPool
+
+    spec = _export(table, sorted(referenced_columns(where_clause)))
+    total = spec['rows']
+    step = -(-total // (_workers * PARALLEL_SCAN_CHUNKS_PER_WORKER))
+    bounds = [(start, min(start + step, total)) for start in range(0, total, step)]
+    try:
+        chunks = list(_get_pool().map(
+            _scan_chunk,
+            [spec] * len(bounds),
+            [where_clause] * len(bounds),
+            *zip(*bounds),
+        ))
+    except BrokenProcessPool:
+        shutdown()
+        return None
+    if None in chunks:
+        return None
+
+    positions = array('q')
+    for chunk in chunks:
+        positions.frombytes(chunk)
+    return positions.tolist()
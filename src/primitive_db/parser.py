@@ -1,63 +1,484 @@
-def parse_where_clause(where_str):
-    if not where_str or '=' not in where_str:
+import re
+
+KEYWORDS = {
+    'select', 'from', 'where', 'and', 'or', 'not', 'in', 'between',
+    'insert', 'into', 'values', 'update', 'set', 'delete', 'export', 'to',
+    'limit', 'offset', 'true', 'false', 'explain', 'group', 'order', 'by',
+    'asc', 'desc', 'join', 'on',
+}
+
+AGGREGATE_FUNCTIONS = ('count', 'sum', 'min', 'max', 'avg')
+
+TOKEN_PATTERN = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<number>-?\d+(?![\w.]))
+  | (?P<op><=|>=|!=|<>|=|<|>)
+  | (?P<punct>[(),*.])
+  | (?P<word>[^\s(),=<>!"'*.]+)
+''', re.VERBOSE)
+
+
+class ParseError(ValueError):
+    pass
+
+
+class Token:
+    __slots__ = ('kind', 'value', 'text', 'start')
+
+    def __init__(self, kind, value, text, start):
+        self.kind = kind
+        self.value = value
+        self.text = text
+        self.start = start
+
+    def __repr__(self):
+        return f'Token({self.kind!r}, {self.value!r})'
+
+
+def _unquote(text):
+    return re.sub(r'\\(.)', r'\1', text[1:-1])
+
+
+def tokenize(text):
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = TOKEN_PATTERN.match(text, pos)
+        if match is None:
+            raise ParseError(f'неожиданный символ "{text[pos]}"')
+        kind = match.lastgroup
+        raw = match.group()
+        if kind == 'string':
+            tokens.append(Token('string', _unquote(raw), raw, pos))
+        elif kind == 'number':
+            tokens.append(Token('number', int(raw), raw, pos))
+        elif kind == 'op':
+            tokens.append(Token('op', '!=' if raw == '<>' else raw, raw, pos))
+        elif kind == 'punct':
+            tokens.append(Token('punct', raw, raw, pos))
+        elif kind == 'word':
+            lowered = raw.lower()
+            if lowered in KEYWORDS:
+                tokens.append(Token('keyword', lowered, raw, pos))
+            else:
+                tokens.append(Token('ident', raw, raw, pos))
+        pos = match.end()
+    tokens.append(Token('eof', None, '', len(text)))
+    return tokens
+
+
+class Parser:
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos]
+
+    def advance(self):
+        token = self.tokens[self.pos]
+        if token.kind != 'eof':
+            self.pos += 1
+        return token
+
+    def at_keyword(self, *keywords):
+        token = self.peek()
+        return token.kind == 'keyword' and token.value in keywords
+
+    def accept_keyword(self, keyword):
+        if self.at_keyword(keyword):
+            return self.advance()
         return None
-    
-    parts = where_str.split('=', 1)
-    if len(parts) != 2:
+
+    def expect_keyword(self, keyword):
+        token = self.accept_keyword(keyword)
+        if token is None:
+            raise ParseError(f'ожидается "{keyword}"')
+        return token
+
+    def accept_punct(self, char):
+        token = self.peek()
+        if token.kind == 'punct' and token.value == char:
+            return self.advance()
         return None
-    
-    column = parts[0].strip()
-    value_str = parts[1].strip()
-    
-    if value_str.startswith('"') and value_str.endswith('"'):
-        value = value_str[1:-1]
-    elif value_str.startswith("'") and value_str.endswith("'"):
-        value = value_str[1:-1]
-    else:
-        if value_str.lower() == 'true':
-            value = True
-        elif value_str.lower() == 'false':
-            value = False
+
+    def expect_punct(self, char):
+        token = self.accept_punct(char)
+        if token is None:
+            raise ParseError(f'ожидается "{char}"')
+        return token
+
+    def expect_ident(self):
+        token = self.peek()
+        if token.kind != 'ident':
+            raise ParseError('ожидается имя')
+        return self.advance().value
+
+    def expect_column(self):
+        name = self.expect_ident()
+        if self.accept_punct('.'):
+            name = f'{name}.{self.expect_ident()}'
+        return name
+
+    def expect_number(self):
+        token = self.peek()
+        if token.kind != 'number' or token.value < 0:
+            raise ParseError('ожидается неотрицательное число')
+        return self.advance().value
+
+    def expect_end(self):
+        if self.peek().kind != 'eof':
+            raise ParseError(f'лишний текст: "{self.text[self.peek().start:]}"')
+
+    def parse_path(self):
+        token = self.peek()
+        if token.kind == 'string':
+            self.advance()
+            return token.value
+        if token.kind == 'eof':
+            raise ParseError('ожидается имя файла')
+        # Путь к файлу - весь остаток команды.
+        path = self.text[token.start:].strip()
+        self.pos = len(self.tokens) - 1
+        return path
+
+    def parse_literal(self):
+        token = self.advance()
+        if token.kind in ('string', 'number', 'ident'):
+            return token.value
+        if token.kind == 'keyword' and token.value in ('true', 'false'):
+            return token.value == 'true'
+        raise ParseError('ожидается значение')
+
+    def parse_expression(self):
+        node = self.parse_and()
+        while self.accept_keyword('or'):
+            node = ('or', node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.accept_keyword('and'):
+            node = ('and', node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if self.accept_keyword('not'):
+            return ('not', self.parse_not())
+        return self.parse_predicate()
+
+    def parse_predicate(self):
+        if self.accept_punct('('):
+            node = self.parse_expression()
+            self.expect_punct(')')
+            return node
+
+        column = self.expect_column()
+        token = self.peek()
+
+        if token.kind == 'op':
+            self.advance()
+            return ('cmp', token.value, column, self.parse_literal())
+
+        negate = self.accept_keyword('not') is not None
+        if self.accept_keyword('in'):
+            self.expect_punct('(')
+            values = [self.parse_literal()]
+            while self.accept_punct(','):
+                values.append(self.parse_literal())
+            self.expect_punct(')')
+            node = ('in', column, tuple(values))
+        elif self.accept_keyword('between'):
+            low = self.parse_literal()
+            self.expect_keyword('and')
+            node = ('between', column, low, self.parse_literal())
         else:
-            try:
-                value = int(value_str)
-            except ValueError:
-                value = value_str
-    
-    return {column: value}
-
-
-def parse_set_clause(set_str):
-    result = {}
-    assignments = set_str.split(',')
-    
-    for assignment in assignments:
-        if '=' not in assignment:
-            continue
-        
-        parts = assignment.split('=', 1)
-        if len(parts) != 2:
-            continue
-        
-        column = parts[0].strip()
-        value_str = parts[1].strip()
-        
-        if value_str.startswith('"') and value_str.endswith('"'):
-            value = value_str[1:-1]
-        elif value_str.startswith("'") and value_str.endswith("'"):
-            value = value_str[1:-1]
+            raise ParseError(f'ожидается условие для столбца {column}')
+
+        return ('not', node) if negate else node
+
+    def parse_where(self):
+        if self.accept_keyword('where'):
+            return self.parse_expression()
+        return None
+
+    def parse_assignments(self):
+        assignments = {}
+        while True:
+            column = self.expect_ident()
+            token = self.advance()
+            if token.kind != 'op' or token.value != '=':
+                raise ParseError('ожидается "="')
+            assignments[column] = self.parse_literal()
+            if not self.accept_punct(','):
+                return assignments
+
+    def parse_value(self):
+        # Значение без кавычек - весь текст до запятой или скобки,
+        # например x.y или 3.5: его разбирает insert по типу столбца.
+        first = last = self.peek()
+        if first.kind == 'string':
+            return self.advance().text
+        while not (
+            last.kind == 'eof'
+            or last.kind == 'punct' and last.value in (',', ')')
+        ):
+            self.advance()
+            last = self.peek()
+        if last is first:
+            raise ParseError('ожидается значение')
+        return self.text[first.start:last.start].strip()
+
+    def parse_value_group(self):
+        self.expect_punct('(')
+        values = []
+        if self.accept_punct(')'):
+            return values
+        while True:
+            values.append(self.parse_value())
+            if self.accept_punct(')'):
+                return values
+            self.expect_punct(',')
+
+    def parse_insert(self):
+        self.expect_keyword('insert')
+        self.expect_keyword('into')
+        table_name = self.expect_ident()
+        self.expect_keyword('values')
+        rows = [self.parse_value_group()]
+        while self.accept_punct(','):
+            rows.append(self.parse_value_group())
+        self.expect_end()
+        return {'type': 'insert', 'table': table_name, 'rows': rows}
+
+    def parse_select_item(self):
+        name = self.expect_ident()
+        if self.accept_punct('.'):
+            return ('column', f'{name}.{self.expect_ident()}')
+        if not self.accept_punct('('):
+            return ('column', name)
+
+        func = name.lower()
+        if func not in AGGREGATE_FUNCTIONS:
+            raise ParseError(f'неизвестная функция {name}')
+        if self.accept_punct('*'):
+            if func != 'count':
+                raise ParseError(f'{func}(*) не поддерживается')
+            column = None
         else:
-            if value_str.lower() == 'true':
-                value = True
-            elif value_str.lower() == 'false':
-                value = False
+            column = self.expect_column()
+        self.expect_punct(')')
+        return ('agg', func, column)
+
+    def parse_select_list(self):
+        if self.at_keyword('from'):
+            return None
+        if self.accept_punct('*'):
+            return None
+        items = [self.parse_select_item()]
+        while self.accept_punct(','):
+            items.append(self.parse_select_item())
+        return items
+
+    def parse_order_by(self):
+        order_by = []
+        while True:
+            item = self.parse_select_item()
+            descending = False
+            if self.accept_keyword('desc'):
+                descending = True
             else:
-                try:
-                    value = int(value_str)
-                except ValueError:
-                    value = value_str
-        
-        result[column] = value
-    
-    return result
+                self.accept_keyword('asc')
+            order_by.append((item, descending))
+            if not self.accept_punct(','):
+                return order_by
+
+    def parse_join(self):
+        if not self.accept_keyword('join'):
+            return None
+        table_name = self.expect_ident()
+        self.expect_keyword('on')
+        left = self.expect_column()
+        token = self.advance()
+        if token.kind != 'op' or token.value != '=':
+            raise ParseError('ожидается "=" в условии соединения')
+        return {'table': table_name, 'on': (left, self.expect_column())}
+
+    def parse_select(self):
+        self.expect_keyword('select')
+        columns = self.parse_select_list()
+        self.expect_keyword('from')
+        command = {
+            'type': 'select',
+            'table': self.expect_ident(),
+            'columns': columns,
+            'join': self.parse_join(),
+            'where': self.parse_where(),
+            'group_by': [],
+            'order_by': [],
+            'limit': None,
+            'offset': 0,
+            'into': None,
+        }
+        if self.accept_keyword('group'):
+            self.expect_keyword('by')
+            command['group_by'].append(self.expect_column())
+            while self.accept_punct(','):
+                command['group_by'].append(self.expect_column())
+        if self.accept_keyword('order'):
+            self.expect_keyword('by')
+            command['order_by'] = self.parse_order_by()
+        if self.accept_keyword('limit'):
+            command['limit'] = self.expect_number()
+        if self.accept_keyword('offset'):
+            command['offset'] = self.expect_number()
+        if self.accept_keyword('into'):
+            command['into'] = self.parse_path()
+        self.expect_end()
+        return command
+
+    def parse_update(self):
+        self.expect_keyword('update')
+        table_name = self.expect_ident()
+        self.expect_keyword('set')
+        assignments = self.parse_assignments()
+        if not self.at_keyword('where'):
+            raise ParseError('ожидается "where"')
+        where = self.parse_where()
+        self.expect_end()
+        return {
+            'type': 'update',
+            'table': table_name,
+            'set': assignments,
+            'where': where,
+        }
+
+    def parse_delete(self):
+        self.expect_keyword('delete')
+        self.expect_keyword('from')
+        table_name = self.expect_ident()
+        if not self.at_keyword('where'):
+            raise ParseError('ожидается "where"')
+        where = self.parse_where()
+        self.expect_end()
+        return {'type': 'delete', 'table': table_name, 'where': where}
+
+    def parse_export(self):
+        self.expect_keyword('export')
+        table_name = self.expect_ident()
+        where = self.parse_where()
+        self.expect_keyword('to')
+        return {
+            'type': 'export',
+            'table': table_name,
+            'columns': None,
+            'where': where,
+            'group_by': [],
+            'order_by': [],
+            'limit': None,
+            'offset': 0,
+            'path': self.parse_path(),
+        }
+
+    def parse_explain(self):
+        self.expect_keyword('explain')
+        if not self.at_keyword('select'):
+            raise ParseError('ожидается "select"')
+        return {'type': 'explain', 'query': self.parse_select()}
+
+
+def iter_statements(lines):
+    # Команды разделяются переводом строки или ';' вне кавычек;
+    # строки, начинающиеся с '--', - комментарии.
+    current = []
+    quote = None
+    for line in lines:
+        if not line.endswith('\n'):
+            line += '\n'
+        for i, char in enumerate(line):
+            if quote:
+                if char == quote and (i == 0 or line[i - 1] != '\\'):
+                    quote = None
+            elif char in ('"', "'"):
+                quote = char
+            elif char in (';', '\n'):
+                statement = ''.join(current).strip()
+                current = []
+                if statement and not statement.startswith('--'):
+                    yield statement
+                continue
+            current.append(char)
+
+    statement = ''.join(current).strip()
+    if statement and not statement.startswith('--'):
+        yield statement
+
+
+def parse_command(text):
+    parser = Parser(text)
+    token = parser.peek()
+    if token.kind != 'keyword':
+        raise ParseError('неизвестная команда')
+    handlers = {
+        'insert': parser.parse_insert,
+        'select': parser.parse_select,
+        'update': parser.parse_update,
+        'delete': parser.parse_delete,
+        'export': parser.parse_export,
+        'explain': parser.parse_explain,
+    }
+    handler = handlers.get(token.value)
+    if handler is None:
+        raise ParseError('неизвестная команда')
+    return handler()
+
+
+def is_identifier(name):
+    # Имя таблицы или столбца должно разбираться как одно имя:
+    # ключевые слова и служебные символы в нём недопустимы.
+    try:
+        tokens = tokenize(name)
+    except ParseError:
+        return False
+    return len(tokens) == 2 and tokens[0].kind == 'ident'
+
+
+def parse_where_clause(where_str):
+    parser = Parser(where_str)
+    node = parser.parse_expression()
+    parser.expect_end()
+    return node
+
+
+def item_label(item):
+    if item[0] == 'column':
+        return item[1]
+    return f'{item[1]}({item[2] or "*"})'
+
+
+def format_literal(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, str):
+        escaped = value.replace('\\', '\\\\').replace('"', '\\"')
+        return f'"{escaped}"'
+    return str(value)
+
 
+def format_where(node):
+    kind = node[0]
+    if kind in ('and', 'or'):
+        return f'({format_where(node[1])} {kind} {format_where(node[2])})'
+    if kind == 'not':
+        return f'not {format_where(node[1])}'
+    if kind == 'cmp':
+        return f'{node[2]} {node[1]} {format_literal(node[3])}'
+    if kind == 'in':
+        values = ', '.join(format_literal(value) for value in node[2])
+        return f'{node[1]} in ({values})'
+    return (
+        f'{node[1]} between {format_literal(node[2])} '
+        f'and {format_literal(node[3])}'
+    )
@@ -0,0 +1,170 @@
+import math
+
+from src.primitive_db.predicate import conjuncts, matches_type
+
+# Условные единицы стоимости: проверка строки при полном просмотре,
+# выборка строки по позиции из индекса и один поиск в индексе.
+SCAN_ROW_COST = 1.0
+INDEX_ROW_COST = 2.0
+INDEX_PROBE_COST = 4.0
+
+DEFAULT_EQUAL_SELECTIVITY = 0.1
+DEFAULT_RANGE_SELECTIVITY = 0.3
+
+RANGE_BOUNDS = {
+    '<': lambda value: (None, value, True, False),
+    '<=': lambda value: (None, value, True, True),
+    '>': lambda value: (value, None, False, True),
+    '>=': lambda value: (value, None, True, True),
+}
+
+
+def collect_stats(table):
+    positions = table.positions()
+    stats = {'rows': len(positions), 'columns': {}}
+    for col_name, _ in table.columns:
+        store = table.stores[col_name]
+        values = {store.get(pos) for pos in positions}
+        stats['columns'][col_name] = {
+            'distinct': len(values),
+            'min': min(values) if values else None,
+            'max': max(values) if values else None,
+        }
+    return stats
+
+
+def column_stats(table, column):
+    # Собранная командой analyze статистика дополняется тем, что бесплатно
+    # известно из индексов.
+    stats = dict(((table.stats or {}).get('columns') or {}).get(column) or {})
+    index = table.indexes.get(column)
+    if index is None:
+        return stats
+    if index.kind in ('primary', 'hash'):
+        stats['distinct'] = len(index.entries)
+    elif index.keys:
+        stats['min'] = index.keys[0]
+        stats['max'] = index.keys[-1]
+    return stats
+
+
+def _condition_operands(condition):
+    if condition[0] == 'cmp':
+        return condition[2], (condition[3],)
+    if condition[0] == 'in':
+        return condition[1], condition[2]
+    return condition[1], condition[2:]
+
+
+def _out_of_range(value, stats):
+    low, high = stats.get('min'), stats.get('max')
+    if low is None or high is None or type(low) is not type(value):
+        return False
+    return value < low or value > high
+
+
+def _estimate_equal(rows, stats, value):
+    if _out_of_range(value, stats):
+        return 0
+    distinct = stats.get('distinct')
+    if distinct:
+        return rows / distinct
+    return rows * DEFAULT_EQUAL_SELECTIVITY
+
+
+def _estimate_range(rows, stats, low, high):
+    min_value, max_value = stats.get('min'), stats.get('max')
+    if not isinstance(min_value, int) or not isinstance(max_value, int):
+        return rows * DEFAULT_RANGE_SELECTIVITY
+    if isinstance(min_value, bool) or max_value == min_value:
+        return rows * DEFAULT_RANGE_SELECTIVITY
+    low = min_value if low is None else max(low, min_value)
+    high = max_value if high is None else min(high, max_value)
+    if high < low:
+        return 0
+    return rows * (high - low + 1) / (max_value - min_value + 1)
+
+
+def _index_plan(table, condition, rows):
+    kind = condition[0]
+    column, values = _condition_operands(condition)
+    index = table.indexes.get(column)
+    if index is None:
+        return None
+
+    col_type = dict(table.columns)[column]
+    if not all(matches_type(value, col_type) for value in values):
+        return None
+
+    stats = column_stats(table, column)
+    probe_cost = INDEX_PROBE_COST * max(1, math.log2(rows + 1))
+    if kind == 'cmp' and condition[1] == '=':
+        access = 'index'
+        estimate = _estimate_equal(rows, stats, values[0])
+    elif kind == 'in':
+        access = 'index'
+        values = set(values)
+        estimate = sum(_estimate_equal(rows, stats, value) for value in values)
+        probe_cost *= len(values)
+    elif index.kind != 'sorted':
+        return None
+    elif kind == 'between':
+        access = 'range'
+        estimate = _estimate_range(rows, stats, *values)
+    elif kind == 'cmp' and condition[1] in RANGE_BOUNDS:
+        access = 'range'
+        low, high, _, _ = RANGE_BOUNDS[condition[1]](values[0])
+        estimate = _estimate_range(rows, stats, low, high)
+    else:
+        return None
+
+    estimate = min(estimate, rows)
+    return {
+        'access': access,
+        'column': column,
+        'index': index.kind,
+        'condition': condition,
+        'rows': estimate,
+        'cost': probe_cost + estimate * INDEX_ROW_COST,
+    }
+
+
+def plan_query(table, where_clause):
+    rows = len(table)
+    scan = {
+        'access': 'scan',
+        'column': None,
+        'index': None,
+        'condition': None,
+        'rows': rows,
+        'cost': rows * SCAN_ROW_COST,
+    }
+    plans = [scan]
+    for condition in conjuncts(where_clause):
+        if condition[0] in ('cmp', 'in', 'between'):
+            plan = _index_plan(table, condition, rows)
+            if plan is not None:
+                plans.append(plan)
+
+    best = min(plans, key=lambda plan: plan['cost'])
+    return {'best': best, 'alternatives': plans, 'where': where_clause}
+
+
+def plan_candidates(table, plan):
+    best = plan['best']
+    if best['access'] == 'scan':
+        return None
+
+    condition = best['condition']
+    index = table.indexes[best['column']]
+    if condition[0] == 'cmp' and condition[1] == '=':
+        positions = index.lookup(condition[3])
+    elif condition[0] == 'in':
+        positions = []
+        for value in set(condition[2]):
+            positions.extend(index.lookup(value))
+    elif condition[0] == 'between':
+        positions = index.range(condition[2], condition[3])
+    else:
+        positions = index.range(*RANGE_BOUNDS[condition[1]](condition[3]))
+    return sorted(positions)
@@ -0,0 +1,178 @@
+from functools import lru_cache
+
+PYTHON_TYPES = {'int': int, 'str': str, 'bool': bool}
+
+COMPARISONS = {
+    '=': '==',
+    '!=': '!=',
+    '<': '<',
+    '<=': '<=',
+    '>': '>',
+    '>=': '>=',
+}
+
+
+def matches_type(value, col_type):
+    # bool - подкласс int, поэтому тип сравнивается точно.
+    return type(value) is PYTHON_TYPES[col_type]
+
+
+class _Compiler:
+    def __init__(self, columns, accessor):
+        self.columns = columns
+        self.accessor = accessor
+        self.accessors = {}
+        self.args = []
+        self.names = []
+
+    def bind(self, value):
+        name = f'k{len(self.args)}'
+        self.names.append(name)
+        self.args.append(value)
+        return name
+
+    def column(self, col_name):
+        if col_name not in self.columns:
+            raise KeyError(col_name)
+        expr = self.accessors.get(col_name)
+        if expr is None:
+            expr = self.accessors[col_name] = self.accessor(self, col_name)
+        return expr
+
+    def check_value(self, col_name, value):
+        col_type = self.columns[col_name]
+        if not matches_type(value, col_type):
+            raise ValueError(
+                f'Неверный тип значения для столбца {col_name}: '
+                f'ожидается {col_type}'
+            )
+
+    def compile(self, node):
+        kind = node[0]
+        if kind in ('and', 'or'):
+            return (
+                f'({self.compile(node[1])} {kind} {self.compile(node[2])})'
+            )
+        if kind == 'not':
+            return f'(not {self.compile(node[1])})'
+        if kind == 'cmp':
+            return self.compile_comparison(*node[1:])
+        if kind == 'in':
+            return self.compile_in(*node[1:])
+        if kind == 'between':
+            return self.compile_between(*node[1:])
+        raise ValueError(f'неизвестное условие {kind}')
+
+    def compile_comparison(self, op, col_name, value):
+        expr = self.column(col_name)
+        if not matches_type(value, self.columns[col_name]):
+            # Значение другого типа никогда не равно значению столбца.
+            if op == '=':
+                return 'False'
+            if op == '!=':
+                return 'True'
+            self.check_value(col_name, value)
+        return f'({expr} {COMPARISONS[op]} {self.bind(value)})'
+
+    def compile_in(self, col_name, values):
+        expr = self.column(col_name)
+        col_type = self.columns[col_name]
+        matching = frozenset(
+            value for value in values if matches_type(value, col_type)
+        )
+        if not matching:
+            return 'False'
+        return f'({expr} in {self.bind(matching)})'
+
+    def compile_between(self, col_name, low, high):
+        expr = self.column(col_name)
+        self.check_value(col_name, low)
+        self.check_value(col_name, high)
+        return f'({self.bind(low)} <= {expr} <= {self.bind(high)})'
+
+
+def _table_accessor(table):
+    def accessor(compiler, col_name):
+        store = table.stores[col_name]
+        col_type = compiler.columns[col_name]
+        if col_type == 'int':
+            return f'{compiler.bind(store.values)}[item]'
+        if col_type == 'bool':
+            return f'({compiler.bind(store.values)}[item] == 1)'
+        return f'{compiler.bind(store.get)}(item)'
+    return accessor
+
+
+def _row_accessor(compiler, col_name):
+    return f'item[{compiler.bind(col_name)}]'
+
+
+@lru_cache(maxsize=256)
+def _build_factory(names, condition):
+    # Условие компилируется в одно списковое включение: на каждую строку
+    # не приходится ни одного вызова функции-предиката.
+    params = ', '.join(names)
+    source = (
+        f'def _factory({params}):\n'
+        f'    def _filter(items):\n'
+        f'        return [item for item in items if {condition}]\n'
+        f'    return _filter\n'
+    )
+    namespace = {}
+    exec(compile(source, '<where>', 'exec'), namespace)
+    return namespace['_factory']
+
+
+def _compile(compiler, where_clause):
+    condition = compiler.compile(where_clause)
+    factory = _build_factory(tuple(compiler.names), condition)
+    return factory(*compiler.args)
+
+
+def compile_predicate(table, where_clause):
+    compiler = _Compiler(dict(table.columns), _table_accessor(table))
+    return _compile(compiler, where_clause)
+
+
+def compile_row_predicate(columns, where_clause):
+    return _compile(_Compiler(dict(columns), _row_accessor), where_clause)
+
+
+def conjuncts(where_clause):
+    if where_clause is None:
+        return []
+    if where_clause[0] == 'and':
+        return conjuncts(where_clause[1]) + conjuncts(where_clause[2])
+    return [where_clause]
+
+
+
+def referenced_columns(where_clause):
+    kind = where_clause[0]
+    if kind in ('and', 'or'):
+        return (
+            referenced_columns(where_clause[1])
+            | referenced_columns(where_clause[2])
+        )
+    if kind == 'not':
+        return referenced_columns(where_clause[1])
+    if kind == 'cmp':
+        return {where_clause[2]}
+    return {where_clause[1]}
+
+
+def rename_columns(where_clause, mapping):
+    kind = where_clause[0]
+    if kind in ('and', 'or'):
+        return (
+            kind,
+            rename_columns(where_clause[1], mapping),
+            rename_columns(where_clause[2], mapping),
+        )
+    if kind == 'not':
+        return (kind, rename_columns(where_clause[1], mapping))
+    if kind == 'cmp':
+        op, column, value = where_clause[1:]
+        return (kind, op, mapping.get(column, column), value)
+    column = where_clause[1]
+    return (kind, mapping.get(column, column), *where_clause[2:])
@@ -0,0 +1,205 @@
+import heapq
+from functools import cmp_to_key
+
+from src.primitive_db.parser import item_label
+
+
+def is_aggregate(command):
+    items = command.get('columns') or ()
+    return bool(command.get('group_by')) or any(
+        item[0] == 'agg' for item in items
+    )
+
+
+def _check_column(column_types, column):
+    if column not in column_types:
+        raise KeyError(column)
+
+
+def output_columns(columns, command):
+    column_types = dict(columns)
+    items = command.get('columns')
+    group_by = command.get('group_by') or []
+    for column in group_by:
+        _check_column(column_types, column)
+
+    if items is None:
+        if group_by:
+            raise ValueError('при group by нужно перечислить столбцы')
+        labels = [col_name for col_name, _ in columns]
+    else:
+        aggregate = is_aggregate(command)
+        for item in items:
+            if item[0] == 'column':
+                _check_column(column_types, item[1])
+                if aggregate and item[1] not in group_by:
+                    raise ValueError(
+                        f'столбец {item[1]} должен входить в group by'
+                    )
+            elif item[2] is not None:
+                _check_column(column_types, item[2])
+                if item[1] in ('sum', 'avg') and column_types[item[2]] == 'str':
+                    raise ValueError(
+                        f'функция {item[1]} неприменима к столбцу '
+                        f'{item[2]} типа str'
+                    )
+        labels = [item_label(item) for item in items]
+
+    for item, _ in command.get('order_by') or ():
+        if is_aggregate(command):
+            label = item_label(item)
+            if label not in labels and label not in group_by:
+                raise ValueError(
+                    f'сортировка по {label} невозможна: его нет в запросе'
+                )
+        elif item[0] == 'agg':
+            raise ValueError('агрегатная функция в order by без агрегации')
+        else:
+            _check_column(column_types, item[1])
+
+    return labels
+
+
+def _ordered(values, keys, directions, count):
+    # При count берутся только первые count значений: куча размера count
+    # вместо сортировки всего результата.
+    if len(set(directions)) == 1:
+        if len(keys) == 1:
+            key = keys[0]
+        else:
+            def key(value):
+                return tuple(get(value) for get in keys)
+        descending = directions[0]
+        if count is None:
+            return sorted(values, key=key, reverse=descending)
+        pick = heapq.nlargest if descending else heapq.nsmallest
+        return pick(count, values, key=key)
+
+    def compare(left, right):
+        for get, descending in zip(keys, directions):
+            a, b = get(left), get(right)
+            if a != b:
+                result = -1 if a < b else 1
+                return -result if descending else result
+        return 0
+
+    ordered_key = cmp_to_key(compare)
+    if count is None:
+        return sorted(values, key=ordered_key)
+    return heapq.nsmallest(count, values, key=ordered_key)
+
+
+def order_positions(table, positions, order_by, count=None):
+    keys = [table.stores[item[1]].get for item, _ in order_by]
+    directions = [descending for _, descending in order_by]
+    return _ordered(positions, keys, directions, count)
+
+
+def order_rows(rows, order_by, count=None):
+    keys = [
+        (lambda row, label=item_label(item): row[label])
+        for item, _ in order_by
+    ]
+    directions = [descending for _, descending in order_by]
+    return _ordered(rows, keys, directions, count)
+
+
+def project_rows(table, positions, labels):
+    stores = [(label, table.stores[label]) for label in labels]
+    for pos in positions:
+        yield {label: store.get(pos) for label, store in stores}
+
+
+def _new_state():
+    # count, sum, min, max
+    return [0, 0, None, None]
+
+
+def _finish(func, state):
+    count, total, low, high = state
+    if func == 'count':
+        return count
+    if func == 'sum':
+        return total
+    if func == 'min':
+        return low
+    if func == 'max':
+        return high
+    return total / count if count else None
+
+
+def aggregate_rows(items, getter, command):
+    # getter(столбец) возвращает функцию, читающую значение столбца
+    # для элемента items: позиции в таблице или строки соединения.
+    group_by = command['group_by']
+    aggregates = [item for item in command['columns'] if item[0] == 'agg']
+    group_getters = [getter(column) for column in group_by]
+    specs = [
+        (item[1], None if item[2] is None else getter(item[2]))
+        for item in aggregates
+    ]
+
+    # Один проход по строкам: для каждой группы хранятся только счётчики.
+    groups = {}
+    for element in items:
+        key = tuple(get(element) for get in group_getters)
+        states = groups.get(key)
+        if states is None:
+            states = groups[key] = [_new_state() for _ in specs]
+        for state, (func, get) in zip(states, specs):
+            state[0] += 1
+            if func == 'count':
+                continue
+            value = get(element)
+            if func in ('sum', 'avg'):
+                state[1] += value
+            elif func == 'min':
+                if state[2] is None or value < state[2]:
+                    state[2] = value
+            elif state[3] is None or value > state[3]:
+                state[3] = value
+
+    if not groups and not group_by:
+        groups[()] = [_new_state() for _ in specs]
+
+    rows = []
+    for key, states in groups.items():
+        row = dict(zip(group_by, key))
+        for item, state in zip(aggregates, states):
+            row[item_label(item)] = _finish(item[1], state)
+        rows.append(row)
+    return rows
+
+
+def count_groups_from_index(table, command):
+    # Подсчёт строк по группам берётся из индекса без просмотра таблицы.
+    group_by = command['group_by']
+    if command['where'] is not None or len(group_by) != 1:
+        return None
+    column = group_by[0]
+    allowed = {('column', column), ('agg', 'count', None)}
+    if not set(command['columns']) <= allowed:
+        return None
+
+    index = table.indexes.get(column)
+    if index is None or index.kind == 'primary':
+        return None
+    label = item_label(('agg', 'count', None))
+    if index.kind == 'hash':
+        return [
+            {column: value, label: len(positions)}
+            for value, positions in index.entries.items()
+        ]
+
+    rows = []
+    for value in index.keys:
+        if rows and rows[-1][column] == value:
+            rows[-1][label] += 1
+        else:
+            rows.append({column: value, label: 1})
+    return rows
+
+
+def select_fields(rows, labels):
+    for row in rows:
+        yield {label: row.get(label) for label in labels}
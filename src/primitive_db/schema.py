@@ -0,0 +1,161 @@
+from functools import lru_cache
+
+from src.primitive_db.predicate import PYTHON_TYPES
+from src.primitive_db.table import COLUMN_TYPES
+
+
+def to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return value.lower() in ('true', '1', 'yes')
+    return bool(value)
+
+
+CONVERTERS = {'int': int, 'str': str, 'bool': to_bool}
+
+BOOL_STRINGS = {'true': True, '1': True, 'yes': True,
+                'false': False, '0': False, 'no': False}
+
+
+# Значения из файла импорта: JSONL сохраняет типы значений, поэтому они
+# проверяются строго, а не приводятся как строки из insert.
+def import_int(value):
+    if isinstance(value, bool) or value is None:
+        raise ValueError(value)
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(value)
+        return int(value)
+    return int(value)
+
+
+def import_str(value):
+    if value is None or isinstance(value, (bool, dict, list)):
+        raise ValueError(value)
+    return str(value)
+
+
+def import_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in BOOL_STRINGS:
+        return BOOL_STRINGS[value.strip().lower()]
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    raise ValueError(value)
+
+
+IMPORT_CONVERTERS = {'int': import_int, 'str': import_str, 'bool': import_bool}
+
+
+def _type_error(col_name, col_type):
+    return f'Неверный тип для столбца {col_name}: ожидается {col_type}'
+
+
+class Schema:
+    # Столбцы таблицы, разобранные один раз: преобразователи и проверки
+    # типов выбраны заранее, и в цикле по строкам нет сравнения имён типов.
+    __slots__ = ('columns', 'types', 'python_types', 'converters', 'importers')
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.types = dict(columns)
+        self.python_types = {
+            col_name: PYTHON_TYPES[col_type] for col_name, col_type in columns
+        }
+        # Для каждого столбца, кроме ID: имя, преобразование и ошибка для
+        # строки в кавычках (None, если столбец строковый).
+        self.converters = tuple(
+            (
+                col_name,
+                CONVERTERS[col_type],
+                None if col_type == 'str' else _type_error(col_name, col_type),
+            )
+            for col_name, col_type in columns[1:]
+        )
+        self.importers = tuple(
+            (col_name, IMPORT_CONVERTERS[col_type])
+            for col_name, col_type in columns[1:]
+        )
+
+
+@lru_cache(maxsize=256)
+def _compile_schema(columns):
+    return Schema(columns)
+
+
+def table_schema(metadata, table_name):
+    # Схема кэшируется по списку столбцов из метаданных, поэтому
+    # пересоздание таблицы или смена столбцов дают новую схему.
+    columns = metadata[table_name]['columns']
+    return _compile_schema(tuple(
+        (col_name, col_type) for col_name, col_type in columns
+    ))
+
+
+class SchemaHistory:
+    # Версия схемы и список изменений столбцов (schema_changes в метаданных).
+    # Снимок и строки журнала хранят версию, при которой они записаны,
+    # и приводятся к текущим столбцам при чтении, без перезаписи файлов.
+    __slots__ = ('version', 'columns', 'changes', '_sources')
+
+    def __init__(self, table_meta):
+        self.version = table_meta.get('schema_version', 0)
+        self.columns = table_meta['columns']
+        self.changes = table_meta.get('schema_changes', [])
+        self._sources = {}
+
+    def sources(self, since):
+        # Для каждого текущего столбца - имя, под которым он записан в данных
+        # версии since (None, если столбец добавлен позже), и значение для
+        # строк, где его нет. None - если данные уже в текущей схеме.
+        if since >= self.version:
+            return None
+        cached = self._sources.get(since)
+        if cached is not None:
+            return cached
+
+        changes = [change for change in self.changes if change['version'] > since]
+        sources = {}
+        for col_name, col_type in self.columns:
+            source, default = col_name, COLUMN_TYPES[col_type].default
+            for change in reversed(changes):
+                if change['op'] == 'rename' and change['to'] == source:
+                    source = change['column']
+                elif change['op'] == 'add' and change['column'] == source:
+                    source, default = None, change['default']
+                    break
+            sources[col_name] = (source, default)
+        self._sources[since] = sources
+        return sources
+
+    def upgrade_entry(self, entry):
+        sources = self.sources(entry.get('v', 0))
+        if sources is None:
+            return entry
+        if 'row' in entry:
+            row = entry['row']
+            return {**entry, 'row': {
+                col_name: row.get(source, default)
+                for col_name, (source, default) in sources.items()
+            }}
+        if 'set' in entry:
+            changes = entry['set']
+            return {**entry, 'set': {
+                col_name: changes[source]
+                for col_name, (source, _) in sources.items()
+                if source in changes
+            }}
+        return entry
+
+
+def schema_version(metadata, table_name):
+    return metadata[table_name].get('schema_version', 0)
+
+
+def table_history(metadata, table_name):
+    # Для таблицы, схема которой не менялась, приводить данные не нужно.
+    if not schema_version(metadata, table_name):
+        return None
+    return SchemaHistory(metadata[table_name])
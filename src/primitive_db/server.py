@@ -0,0 +1,156 @@
+import asyncio
+import io
+import json
+import os
+from contextlib import redirect_stdout
+
+from src.primitive_db import metrics
+from src.primitive_db.constants import (
+    METADATA_FILE,
+    SERVER_HOST,
+    SERVER_MAX_REQUEST_BYTES,
+    SERVER_PORT,
+)
+from src.primitive_db.decorators import set_auto_confirm
+from src.primitive_db.engine import execute_with_status, parse_query, run_query
+from src.primitive_db.session import Session
+from src.primitive_db.utils import load_metadata, load_table_data
+
+# Протокол: по строке JSON на запрос и на ответ.
+# Запрос: {"id": 1, "command": "select from users where age > 20"}.
+# Ответ на select: {"id": 1, "ok": true, "columns": [...], "rows": [[...]]},
+# на остальные команды: {"id": 1, "ok": true, "output": "..."}.
+# При ошибке: {"id": 1, "ok": false, "error": "..."}.
+
+# Команды всех соединений выполняются по очереди в одном рабочем потоке:
+# кэши таблиц и запросов общие и не рассчитаны на параллельный доступ.
+# Цикл событий при этом не блокируется и продолжает принимать соединения
+# и читать запросы, но долгая команда задерживает команды других клиентов.
+_executor = None
+
+
+def warm_tables():
+    # Таблицы и индексы загружаются в кэш до первого запроса.
+    metadata = load_metadata(METADATA_FILE)
+    for table_name in metadata:
+        load_table_data(table_name, metadata)
+    return len(metadata)
+
+
+def _error(message):
+    return {'ok': False, 'error': message.strip()}
+
+
+def _run_command(session, command):
+    # Вывод команды перехватывается и возвращается клиенту текстом.
+    output = io.StringIO()
+    with redirect_stdout(output):
+        if command.lower().startswith('select'):
+            parsed = parse_query(command)
+            if parsed is None:
+                return _error(output.getvalue()), True
+            if not parsed['into']:
+                with metrics.timer('select'):
+                    result = run_query(parsed, session)
+                session.statement_done()
+                if result is None:
+                    return _error(output.getvalue()), True
+                columns, rows = result
+                return {
+                    'ok': True,
+                    'columns': columns,
+                    'rows': [[row.get(name) for name in columns] for row in rows],
+                }, True
+
+    keep_open, text, ok = execute_with_status(command, session)
+    session.statement_done()
+    if not ok:
+        return _error(text), keep_open
+    return {'ok': True, 'output': text}, keep_open
+
+
+def handle_request(session, line):
+    try:
+        request = json.loads(line)
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        return _error(f'некорректный запрос: {e}'), True
+    if not isinstance(request, dict) or not isinstance(
+        request.get('command'), str
+    ):
+        return _error('в запросе нет строки command'), True
+
+    try:
+        response, keep_open = _run_command(session, request['command'].strip())
+    except Exception as e:
+        response, keep_open = _error(f'непредвиденная ошибка: {e}'), True
+    response['id'] = request.get('id')
+    return response, keep_open
+
+
+async def _handle_connection(reader, writer):
+    # У каждого соединения свой сеанс: транзакция одного клиента не видна
+    # другим. Несколько запросов, отправленных подряд, обрабатываются
+    # без ожидания ответа на каждый.
+    loop = asyncio.get_running_loop()
+    session = await loop.run_in_executor(_executor, Session)
+    try:
+        while True:
+            try:
+                line = await reader.readline()
+            except (ConnectionError, ValueError):
+                break
+            if not line:
+                break
+            response, keep_open = await loop.run_in_executor(
+                _executor, handle_request, session, line
+            )
+            writer.write(
+                json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n'
+            )
+            await writer.drain()
+            if not keep_open:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        await loop.run_in_executor(_executor, session.close)
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def serve(host=SERVER_HOST, port=SERVER_PORT, socket_path=None):
+    global _executor
+    from concurrent.futures import ThreadPoolExecutor
+
+    set_auto_confirm(True)
+    _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='primitive-db')
+    table_count = warm_tables()
+    if socket_path:
+        server = await asyncio.start_unix_server(
+            _handle_connection, path=socket_path, limit=SERVER_MAX_REQUEST_BYTES
+        )
+        address = socket_path
+    else:
+        server = await asyncio.start_server(
+            _handle_connection, host, port, limit=SERVER_MAX_REQUEST_BYTES
+        )
+        address = f'{host}:{port}'
+
+    print(f'Сервер запущен на {address}, таблиц в памяти: {table_count}.')
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        _executor.shutdown()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def run_server(host=SERVER_HOST, port=SERVER_PORT, socket_path=None):
+    try:
+        asyncio.run(serve(host, port, socket_path))
+    except KeyboardInterrupt:
+        print('Сервер остановлен.')
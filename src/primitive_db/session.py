@@ -0,0 +1,329 @@
+import copy
+import threading
+import time
+
+from src.primitive_db.constants import (
+    BATCH_COMMIT_EVERY,
+    BATCH_MAX_PENDING,
+    DEFAULT_DURABILITY,
+    FLUSH_EVERY,
+    FLUSH_INTERVAL_MS,
+    ID_RESERVE_BLOCK,
+    METADATA_FILE,
+)
+from src.primitive_db.schema import schema_version
+from src.primitive_db.storage import replay_log
+from src.primitive_db.utils import (
+    allocate_ids,
+    append_table_log,
+    commit_changes,
+    load_metadata,
+    load_table_data,
+    merge_metadata,
+    metadata_lock,
+    recover_commit,
+    save_metadata,
+)
+
+
+class Session:
+    # В интерактивном режиме каждое изменение сразу пишется на диск.
+    # В пакетном метаданные читаются один раз, изменения копятся в памяти
+    # и записываются группой каждые commit_every команд и в конце.
+    # Внутри транзакции изменения копятся до commit и отменяются rollback.
+    # В режиме durability='group' изменения тоже копятся в памяти и
+    # записываются после flush_every изменений, фоновым потоком через
+    # flush_interval_ms после первого незаписанного изменения, командой
+    # flush и при завершении: при сбое теряется не больше этого окна.
+    def __init__(
+        self,
+        batch=False,
+        commit_every=BATCH_COMMIT_EVERY,
+        durability=DEFAULT_DURABILITY,
+        flush_every=FLUSH_EVERY,
+        flush_interval_ms=FLUSH_INTERVAL_MS,
+    ):
+        self.batch = batch
+        self.commit_every = commit_every
+        self.durability = durability
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval_ms / 1000
+        self.metadata = None
+        self.base_metadata = None
+        self.metadata_dirty = False
+        self.pending = {}
+        self.pending_count = 0
+        # Версия схемы, при которой построены отложенные строки таблицы.
+        self.pending_versions = {}
+        self.tables = {}
+        self.statements = 0
+        self.in_transaction = False
+        self.reserved_ids = {}
+        self.reserve_sizes = {}
+        self.dirty_since = None
+        self.closed = False
+        # Команды и фоновая запись выполняются по очереди под этой блокировкой.
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+        self.flusher = None
+        if durability == 'group' and self.flush_interval > 0:
+            self.flusher = threading.Thread(
+                target=self._flush_loop, name='primitive-db-flusher', daemon=True
+            )
+            self.flusher.start()
+        # Транзакция, прерванная сбоем после фиксации, дописывается.
+        with metadata_lock(METADATA_FILE):
+            self.recovered = recover_commit(METADATA_FILE)
+
+    def deferred(self):
+        return self.batch or self.in_transaction or self.durability == 'group'
+
+    def _read_metadata(self):
+        self.metadata = load_metadata(METADATA_FILE)
+        self.base_metadata = copy.deepcopy(self.metadata)
+
+    def _has_changes(self):
+        return self.metadata_dirty or bool(self.pending)
+
+    def load_metadata(self):
+        # В режиме group метаданные перечитываются, пока в памяти нет
+        # незаписанных изменений: сеанс видит таблицы других процессов.
+        if (
+            self.metadata is None
+            or not self.deferred()
+            or (
+                self.durability == 'group'
+                and not self.in_transaction
+                and not self._has_changes()
+            )
+        ):
+            self._read_metadata()
+        return self.metadata
+
+    def _mark_dirty(self):
+        if self.dirty_since is not None:
+            return
+        self.dirty_since = time.monotonic()
+        if self.flusher is not None:
+            with self.lock:
+                self.changed.notify()
+
+    def _flush_loop(self):
+        with self.lock:
+            while not self.closed:
+                if self.dirty_since is None or self.in_transaction:
+                    self.changed.wait()
+                    continue
+                remaining = self.dirty_since + self.flush_interval - time.monotonic()
+                if remaining > 0:
+                    self.changed.wait(remaining)
+                    continue
+                try:
+                    self.commit()
+                except Exception as e:
+                    # Изменения остаются в памяти, запись повторится позже.
+                    print(f'Ошибка фоновой записи на диск: {e}')
+                    self.dirty_since = time.monotonic()
+
+    def _merged_metadata(self, metadata):
+        # Вызывается под блокировкой метаданных: файл перечитывается, и в него
+        # переносятся только изменения этого сеанса.
+        return merge_metadata(
+            self.base_metadata, metadata, load_metadata(METADATA_FILE)
+        )
+
+    def _write_metadata(self, metadata):
+        with metadata_lock(METADATA_FILE):
+            metadata = self._merged_metadata(metadata)
+            save_metadata(METADATA_FILE, metadata)
+        self.metadata = metadata
+        self.base_metadata = copy.deepcopy(metadata)
+        return metadata
+
+    def save_metadata(self, metadata):
+        self.metadata = metadata
+        if self.deferred():
+            self.metadata_dirty = True
+            self._mark_dirty()
+        else:
+            self._write_metadata(metadata)
+
+    def _reserve_ids(self, metadata, table_name, count, size):
+        with metadata_lock(METADATA_FILE):
+            current = load_metadata(METADATA_FILE)
+            if table_name not in current:
+                # Таблица создана в этом сеансе и другим процессам не видна:
+                # ID берутся из её метаданных без запаса.
+                return allocate_ids(metadata, table_name, count), count
+            first_id = allocate_ids(current, table_name, size)
+            save_metadata(METADATA_FILE, current)
+            return first_id, size
+
+    def allocate_ids(self, metadata, table_name, count):
+        # ID выдаются под блокировкой метаданных и сразу сохраняются, поэтому
+        # два процесса не получат одинаковых ID. В пакетном режиме и в
+        # транзакции ID резервируются блоками, чтобы не записывать метаданные
+        # на каждую вставку.
+        reserved = self.reserved_ids.get(table_name)
+        if reserved is not None and (
+            metadata[table_name].get('next_id', 0) < reserved[0]
+        ):
+            # Таблица пересоздана: резерв относится к прежней.
+            reserved = None
+        if reserved is None or reserved[1] - reserved[0] < count:
+            # Размер блока удваивается с каждым резервом: короткий сеанс
+            # не оставляет пропусков в ID, а длинный быстро доходит до
+            # ID_RESERVE_BLOCK.
+            size = count
+            if self.deferred():
+                block = self.reserve_sizes.get(table_name, 1)
+                size = max(count, block)
+                self.reserve_sizes[table_name] = min(block * 2, ID_RESERVE_BLOCK)
+            first_id, size = self._reserve_ids(
+                metadata, table_name, count, size
+            )
+            if reserved is None or reserved[1] != first_id:
+                reserved = self.reserved_ids[table_name] = [first_id, first_id]
+            reserved[1] = first_id + size
+
+        first_id = reserved[0]
+        reserved[0] += count
+        metadata[table_name]['next_id'] = reserved[0]
+        return first_id
+
+    def release_ids(self):
+        # Неиспользованные ID возвращаются, если после этого сеанса
+        # их никто не резервировал.
+        unused = {
+            table_name: reserved
+            for table_name, reserved in self.reserved_ids.items()
+            if reserved[0] < reserved[1]
+        }
+        self.reserved_ids.clear()
+        if not unused:
+            return
+        with metadata_lock(METADATA_FILE):
+            current = load_metadata(METADATA_FILE)
+            changed = False
+            for table_name, (next_id, end) in unused.items():
+                table_meta = current.get(table_name)
+                if table_meta is not None and table_meta.get('next_id') == end:
+                    table_meta['next_id'] = next_id
+                    changed = True
+            if changed:
+                save_metadata(METADATA_FILE, current)
+
+    def load_table(self, table_name, metadata):
+        # Таблица с незаписанными изменениями не должна вытесняться из кэша.
+        table = self.tables.get(table_name)
+        if table is not None:
+            return table
+        return load_table_data(table_name, metadata)
+
+    def writable_table(self, table_name, metadata):
+        table = self.load_table(table_name, metadata)
+        if self.in_transaction and table_name not in self.tables:
+            # Таблица копируется перед первым изменением в транзакции,
+            # а закэшированная версия остаётся прежней до commit.
+            table = table.copy()
+            self.tables[table_name] = table
+        return table
+
+    def log_changes(self, table_name, entries, metadata, table=None):
+        if not self.deferred():
+            append_table_log(table_name, entries, metadata, table)
+            return
+
+        if table is None:
+            table = self.writable_table(table_name, metadata)
+            replay_log(table, entries)
+        self.tables[table_name] = table
+        self.pending.setdefault(table_name, []).extend(entries)
+        self.pending_versions.setdefault(
+            table_name, schema_version(metadata, table_name)
+        )
+        self.pending_count += len(entries)
+        self._mark_dirty()
+        # Большой импорт не должен держать в памяти весь журнал.
+        limit = BATCH_MAX_PENDING
+        if self.durability == 'group':
+            limit = min(limit, self.flush_every)
+        if not self.in_transaction and self.pending_count >= limit:
+            self.commit()
+
+    def _discard(self):
+        self.metadata_dirty = False
+        self.pending.clear()
+        self.pending_versions.clear()
+        self.pending_count = 0
+        self.tables.clear()
+        self.dirty_since = None
+
+    def commit(self):
+        with self.lock:
+            # Счётчик ID в метаданных сохраняется раньше строк журнала.
+            if self.metadata_dirty:
+                self._write_metadata(self.metadata)
+                self.metadata_dirty = False
+
+            for table_name, entries in self.pending.items():
+                if table_name in self.metadata:
+                    append_table_log(
+                        table_name, entries, self.metadata,
+                        self.tables[table_name],
+                        self.pending_versions.get(table_name),
+                    )
+            self._discard()
+
+    def begin(self):
+        if self.in_transaction:
+            return False
+        self.commit()
+        self._read_metadata()
+        self.in_transaction = True
+        return True
+
+    def commit_transaction(self):
+        if not self.in_transaction:
+            return False
+        if self.metadata_dirty or self.pending:
+            with metadata_lock(METADATA_FILE):
+                metadata = self._merged_metadata(self.metadata)
+                commit_changes(
+                    METADATA_FILE, metadata, self.pending, self.tables,
+                    self.pending_versions,
+                )
+            self.metadata = metadata
+            self.base_metadata = copy.deepcopy(metadata)
+        self._discard()
+        self.in_transaction = False
+        return True
+
+    def rollback(self):
+        if not self.in_transaction:
+            return False
+        self._discard()
+        self.metadata = None
+        self.in_transaction = False
+        return True
+
+    def statement_done(self):
+        self.statements += 1
+        if (
+            self.batch
+            and not self.in_transaction
+            and self.statements % self.commit_every == 0
+        ):
+            self.commit()
+
+    def close(self):
+        # Незафиксированная транзакция при завершении отменяется.
+        with self.lock:
+            rolled_back = self.rollback()
+            self.commit()
+            self.closed = True
+            self.changed.notify_all()
+        if self.flusher is not None:
+            self.flusher.join()
+        self.release_ids()
+        return rolled_back
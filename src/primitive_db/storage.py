@@ -0,0 +1,297 @@
+import json
+import os
+
+from src.primitive_db import binary_format, metrics
+from src.primitive_db.constants import (
+    DATA_DIR,
+    DEFAULT_TABLE_FORMAT,
+    LOG_COMPACT_MIN_BYTES,
+)
+from src.primitive_db.indexes import (
+    build_indexes,
+    indexes_from_json,
+    indexes_to_json,
+)
+from src.primitive_db.table import Table
+
+SNAPSHOT_EXTENSIONS = {'json': 'json', 'binary': 'bin'}
+
+
+def snapshot_path(table_name, fmt=DEFAULT_TABLE_FORMAT):
+    return os.path.join(DATA_DIR, f'{table_name}.{SNAPSHOT_EXTENSIONS[fmt]}')
+
+
+def log_path(table_name):
+    return os.path.join(DATA_DIR, f'{table_name}.log')
+
+
+def lock_path(table_name):
+    return os.path.join(DATA_DIR, f'{table_name}.lock')
+
+
+def index_path(table_name):
+    return os.path.join(DATA_DIR, f'{table_name}.idx.json')
+
+
+def _file_stamp(filepath):
+    try:
+        stat = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def table_files_stamp(table_name):
+    paths = [snapshot_path(table_name, fmt) for fmt in SNAPSHOT_EXTENSIONS]
+    paths += [log_path(table_name), index_path(table_name)]
+    return tuple(_file_stamp(filepath) for filepath in paths)
+
+
+def metadata_stamp(filepath):
+    return _file_stamp(filepath)
+
+
+def write_json_atomic(filepath, data, indent=None):
+    tmp_path = f'{filepath}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+        metrics.add('bytes_written', f.tell())
+    os.replace(tmp_path, filepath)
+
+
+def remove_file_durable(filepath):
+    # Удаление файла сохраняется после сбоя, только если сброшен каталог.
+    os.remove(filepath)
+    fd = os.open(os.path.dirname(filepath) or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_snapshot(table_name, columns, fmt=DEFAULT_TABLE_FORMAT, history=None):
+    filepath = snapshot_path(table_name, fmt)
+    if fmt == 'binary':
+        return binary_format.read_table(filepath, table_name, columns, history)
+
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+    except FileNotFoundError:
+        records = []
+    # Снимок таблицы, схема которой менялась, хранит версию схемы.
+    version = 0
+    if isinstance(records, dict):
+        version, records = records['schema_version'], records['rows']
+    sources = history.sources(version) if history is not None else None
+    return Table.from_records(table_name, columns, records, sources)
+
+
+def read_log(table_name):
+    entries = []
+    try:
+        with open(log_path(table_name), 'r', encoding='utf-8') as f:
+            for line in f:
+                # Недописанная последняя строка остаётся после сбоя записи.
+                if not line.endswith('\n'):
+                    break
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def log_contains(table_name, marker):
+    try:
+        with open(log_path(table_name), 'rb') as f:
+            return marker.encode('utf-8') in f.read()
+    except FileNotFoundError:
+        return False
+
+
+def replay_log(table, entries, history=None):
+    for entry in entries:
+        if history is not None:
+            entry = history.upgrade_entry(entry)
+        op = entry.get('op')
+        if op == 'insert':
+            record = entry['row']
+            pos = table.find_id(record['ID'])
+            if pos is None:
+                table.append(record)
+            else:
+                table.update(pos, record)
+        elif op == 'update':
+            pos = table.find_id(entry['id'])
+            if pos is not None:
+                table.update(pos, entry['set'])
+        elif op == 'delete':
+            pos = table.find_id(entry['id'])
+            if pos is not None:
+                table.delete(pos)
+    return table
+
+
+def read_indexes(table_name, index_specs, fmt=DEFAULT_TABLE_FORMAT, history=None):
+    if not index_specs:
+        return {}
+    try:
+        with open(index_path(table_name), 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if stored.get('snapshot') != _file_stamp(snapshot_path(table_name, fmt)):
+        return None
+
+    indexes = stored.get('indexes', {})
+    sources = None
+    if history is not None:
+        sources = history.sources(stored.get('schema_version', 0))
+    if sources is not None:
+        # Позиции строк от смены схемы не меняются: индекс переименованного
+        # столбца остаётся верным, а индекс добавленного строится заново.
+        indexes = {
+            col_name: indexes[source]
+            for col_name, (source, _) in sources.items()
+            if source in indexes
+        }
+    return indexes_from_json(indexes, index_specs)
+
+
+def load_table(table_name, columns, index_specs, fmt=DEFAULT_TABLE_FORMAT,
+               history=None):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    table = read_snapshot(table_name, columns, fmt, history)
+
+    indexes = read_indexes(table_name, index_specs, fmt, history)
+    if indexes is None:
+        indexes = build_indexes(table, index_specs)
+    table.indexes = indexes
+
+    return replay_log(table, read_log(table_name), history)
+
+
+def _version(history):
+    return history.version if history is not None else 0
+
+
+def _remove_file(filepath):
+    try:
+        os.remove(filepath)
+    except FileNotFoundError:
+        pass
+
+
+def write_snapshot(table_name, table, index_specs=None, fmt=DEFAULT_TABLE_FORMAT,
+                   schema_version=0):
+    # Снимок всегда пишется в текущей схеме: так старые строки
+    # окончательно приводятся к ней при уплотнении журнала.
+    os.makedirs(DATA_DIR, exist_ok=True)
+    filepath = snapshot_path(table_name, fmt)
+    if fmt == 'binary':
+        binary_format.write_table(filepath, table, schema_version)
+        if metrics.is_enabled():
+            metrics.add('bytes_written', os.path.getsize(filepath))
+    else:
+        records = table.to_records()
+        if schema_version:
+            records = {'schema_version': schema_version, 'rows': records}
+        write_json_atomic(filepath, records, indent=2)
+
+    if index_specs:
+        indexes = build_indexes(table, index_specs, renumber=True)
+        stored = {
+            'snapshot': _file_stamp(filepath),
+            'indexes': indexes_to_json(indexes),
+        }
+        if schema_version:
+            stored['schema_version'] = schema_version
+        write_json_atomic(index_path(table_name), stored)
+    else:
+        _remove_file(index_path(table_name))
+
+
+def truncate_log(table_name):
+    _remove_file(log_path(table_name))
+
+
+def remove_snapshot(table_name, fmt):
+    _remove_file(snapshot_path(table_name, fmt))
+
+
+def remove_table_files(table_name):
+    for fmt in SNAPSHOT_EXTENSIONS:
+        remove_snapshot(table_name, fmt)
+    truncate_log(table_name)
+    _remove_file(index_path(table_name))
+
+
+def _repair_log_tail(f):
+    size = f.seek(0, os.SEEK_END)
+    if size == 0:
+        return
+    f.seek(size - 1)
+    if f.read(1) == b'\n':
+        return
+
+    pos = size
+    while pos > 0:
+        step = min(4096, pos)
+        pos -= step
+        f.seek(pos)
+        chunk = f.read(step)
+        newline = chunk.rfind(b'\n')
+        if newline != -1:
+            f.truncate(pos + newline + 1)
+            return
+    f.truncate(0)
+
+
+def append_log(table_name, entries, schema_version=0):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    if schema_version:
+        entries = [{**entry, 'v': schema_version} for entry in entries]
+    payload = ''.join(
+        json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries
+    ).encode('utf-8')
+
+    with open(log_path(table_name), 'a+b') as f:
+        _repair_log_tail(f)
+        f.seek(0, os.SEEK_END)
+        f.write(payload)
+        metrics.add('bytes_written', len(payload))
+        f.flush()
+        os.fsync(f.fileno())
+        log_size = f.tell()
+
+    return needs_compaction(table_name, log_size)
+
+
+def needs_compaction(table_name, log_size):
+    if log_size < LOG_COMPACT_MIN_BYTES:
+        return False
+    snapshot_size = 0
+    for fmt in SNAPSHOT_EXTENSIONS:
+        stamp = _file_stamp(snapshot_path(table_name, fmt))
+        if stamp is not None:
+            snapshot_size = max(snapshot_size, stamp[0])
+    return log_size > snapshot_size
+
+
+def compact(table_name, columns, index_specs, fmt=DEFAULT_TABLE_FORMAT,
+            history=None):
+    table = load_table(table_name, columns, index_specs, fmt, history)
+    write_snapshot(table_name, table, index_specs, fmt, _version(history))
+    truncate_log(table_name)
+
+
+def convert_table(table_name, columns, index_specs, old_fmt, new_fmt,
+                  history=None):
+    table = load_table(table_name, columns, index_specs, old_fmt, history)
+    write_snapshot(table_name, table, index_specs, new_fmt, _version(history))
+    return table
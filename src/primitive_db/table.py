@@ -0,0 +1,374 @@
+import copy
+from array import array
+from itertools import accumulate, count
+
+from src.primitive_db.indexes import index_record, reindex_record
+
+
+def _int_array(view):
+    values = array('q')
+    values.frombytes(view.cast('B'))
+    return values
+
+
+class IntColumn:
+    type_name = 'int'
+    default = 0
+
+    def __init__(self):
+        self.values = array('q')
+
+    def __len__(self):
+        return len(self.values)
+
+    def is_mapped(self):
+        return not isinstance(self.values, array)
+
+    def _writable(self):
+        # Столбец, прочитанный из mmap, копируется только перед первой записью.
+        if self.is_mapped():
+            self.values = _int_array(self.values)
+
+    def append(self, value):
+        self._writable()
+        self.values.append(value)
+
+    def extend(self, values):
+        self._writable()
+        self.values.extend(values)
+
+    def get(self, pos):
+        return self.values[pos]
+
+    def set(self, pos, value):
+        self._writable()
+        self.values[pos] = value
+
+    def mutable_values(self):
+        # Буфер для записи на месте, например присваиванием по маске.
+        self._writable()
+        return self.values
+
+    def filter_equal(self, value, positions):
+        if isinstance(value, str):
+            return []
+        values = self.values
+        return [pos for pos in positions if values[pos] == value]
+
+    def nbytes(self):
+        return self.values.itemsize * len(self.values)
+
+    def fill(self, count):
+        self._writable()
+        self.values.extend([self.default] * count)
+
+    def copy(self):
+        # Срез mmap остаётся представлением: оно только читается.
+        column = type(self)()
+        column.values = self.values[:]
+        return column
+
+
+class BoolColumn:
+    type_name = 'bool'
+    default = False
+
+    def __init__(self):
+        self.values = bytearray()
+
+    def __len__(self):
+        return len(self.values)
+
+    def is_mapped(self):
+        return not isinstance(self.values, bytearray)
+
+    def _writable(self):
+        if self.is_mapped():
+            self.values = bytearray(self.values)
+
+    def append(self, value):
+        self._writable()
+        self.values.append(1 if value else 0)
+
+    def extend(self, values):
+        self._writable()
+        self.values.extend(1 if value else 0 for value in values)
+
+    def get(self, pos):
+        return self.values[pos] == 1
+
+    def set(self, pos, value):
+        self._writable()
+        self.values[pos] = 1 if value else 0
+
+    def mutable_values(self):
+        self._writable()
+        return self.values
+
+    def filter_equal(self, value, positions):
+        if isinstance(value, str):
+            return []
+        values = self.values
+        flag = 1 if value else 0
+        return [pos for pos in positions if values[pos] == flag]
+
+    def nbytes(self):
+        return len(self.values)
+
+    def fill(self, count):
+        self._writable()
+        self.values.extend(bytes(count))
+
+    def copy(self):
+        column = type(self)()
+        column.values = self.values[:]
+        return column
+
+
+class StrColumn:
+    type_name = 'str'
+    default = ''
+
+    def __init__(self):
+        self.starts = array('q')
+        self.ends = array('q')
+        self.buffer = bytearray()
+
+    def __len__(self):
+        return len(self.starts)
+
+    def is_mapped(self):
+        return not isinstance(self.buffer, bytearray)
+
+    def _writable(self):
+        if self.is_mapped():
+            self.starts = _int_array(self.starts)
+            self.ends = _int_array(self.ends)
+            self.buffer = bytearray(self.buffer)
+
+    def append(self, value):
+        self._writable()
+        encoded = value.encode('utf-8')
+        self.starts.append(len(self.buffer))
+        self.buffer += encoded
+        self.ends.append(len(self.buffer))
+
+    def extend(self, values):
+        self._writable()
+        encoded = [value.encode('utf-8') for value in values]
+        ends = array('q', accumulate(map(len, encoded), initial=len(self.buffer)))
+        self.starts.extend(ends[:-1])
+        self.ends.extend(ends[1:])
+        self.buffer += b''.join(encoded)
+
+    def get(self, pos):
+        return str(self.buffer[self.starts[pos]:self.ends[pos]], 'utf-8')
+
+    def mutable_values(self):
+        self._writable()
+        return self.starts, self.ends, self.buffer
+
+    def set(self, pos, value):
+        self._writable()
+        encoded = value.encode('utf-8')
+        start, end = self.starts[pos], self.ends[pos]
+        if len(encoded) <= end - start:
+            self.buffer[start:start + len(encoded)] = encoded
+            self.ends[pos] = start + len(encoded)
+            return
+        # Старое значение остаётся в буфере до следующей загрузки таблицы.
+        self.starts[pos] = len(self.buffer)
+        self.buffer += encoded
+        self.ends[pos] = len(self.buffer)
+
+    def filter_equal(self, value, positions):
+        if not isinstance(value, str):
+            return []
+        encoded = value.encode('utf-8')
+        size = len(encoded)
+        buffer, starts, ends = memoryview(self.buffer), self.starts, self.ends
+        return [
+            pos for pos in positions
+            if ends[pos] - starts[pos] == size
+            and buffer[starts[pos]:ends[pos]] == encoded
+        ]
+
+    def nbytes(self):
+        return (
+            self.starts.itemsize * (len(self.starts) + len(self.ends))
+            + len(self.buffer)
+        )
+
+    def fill(self, count):
+        self._writable()
+        end = len(self.buffer)
+        self.starts.extend([end] * count)
+        self.ends.extend([end] * count)
+
+    def copy(self):
+        column = type(self)()
+        column.starts = self.starts[:]
+        column.ends = self.ends[:]
+        column.buffer = self.buffer[:]
+        return column
+
+
+# Общий счётчик версий: версия уникальна и для разных объектов одной таблицы,
+# поэтому таблица, перечитанная с диска, не совпадёт по версии со старой.
+_versions = count(1)
+
+COLUMN_TYPES = {
+    'int': IntColumn,
+    'str': StrColumn,
+    'bool': BoolColumn,
+}
+
+
+class Table:
+    def __init__(self, name, columns):
+        self.name = name
+        self.columns = [(col_name, col_type) for col_name, col_type in columns]
+        self.stores = {
+            col_name: COLUMN_TYPES[col_type]()
+            for col_name, col_type in self.columns
+        }
+        self.alive = bytearray()
+        self.live_count = 0
+        self.indexes = {}
+        self.stats = None
+        self.stamp = None
+        # Файл, столбцы которого отображены через mmap: путь, идентификатор
+        # файла и расположение блоков столбцов.
+        self.source = None
+        # Вызывается один раз при следующем изменении таблицы.
+        self.on_change = None
+        self.version = next(_versions)
+
+    @classmethod
+    def from_records(cls, name, columns, records, sources=None):
+        # sources - имена столбцов в записях и значения по умолчанию,
+        # если записи сделаны при старой версии схемы.
+        table = cls(name, columns)
+        if not isinstance(records, list):
+            records = list(records)
+        for col_name, store in table.stores.items():
+            source, default = col_name, store.default
+            if sources is not None:
+                source, default = sources[col_name]
+            store.extend([record.get(source, default) for record in records])
+        table.alive = bytearray(b'\x01') * len(records)
+        table.live_count = len(records)
+        return table
+
+    def __len__(self):
+        return self.live_count
+
+    def column_names(self):
+        return [col_name for col_name, _ in self.columns]
+
+    def _append_values(self, record):
+        for col_name, store in self.stores.items():
+            store.append(record.get(col_name, store.default))
+        self.alive.append(1)
+        self.live_count += 1
+        return len(self.alive) - 1
+
+    def append(self, record):
+        pos = self._append_values(record)
+        if self.indexes:
+            index_record(self.indexes, record, pos)
+        self._changed()
+        return pos
+
+    def is_alive(self, pos):
+        return 0 <= pos < len(self.alive) and self.alive[pos] == 1
+
+    def positions(self):
+        alive = self.alive
+        if self.live_count == len(alive):
+            return range(len(alive))
+        return [pos for pos in range(len(alive)) if alive[pos]]
+
+    def position_chunks(self, size):
+        alive = self.alive
+        total = len(alive)
+        for start in range(0, total, size):
+            stop = min(start + size, total)
+            if self.live_count == total:
+                yield range(start, stop)
+            else:
+                yield [pos for pos in range(start, stop) if alive[pos]]
+
+    def get(self, pos, col_name):
+        return self.stores[col_name].get(pos)
+
+    def row(self, pos):
+        return {
+            col_name: store.get(pos) for col_name, store in self.stores.items()
+        }
+
+    def rows(self, positions=None):
+        if positions is None:
+            positions = self.positions()
+        for pos in positions:
+            yield self.row(pos)
+
+    def to_records(self):
+        return list(self.rows())
+
+    def find_id(self, record_id):
+        primary = self.indexes.get('ID')
+        if primary is not None:
+            positions = primary.lookup(record_id)
+        else:
+            positions = self.stores['ID'].filter_equal(record_id, self.positions())
+        return positions[0] if positions else None
+
+    def update(self, pos, changes):
+        old_record = self.row(pos) if self.indexes else None
+        for col_name, value in changes.items():
+            store = self.stores.get(col_name)
+            if store is not None:
+                store.set(pos, value)
+        if self.indexes:
+            reindex_record(self.indexes, old_record, self.row(pos), pos)
+        self._changed()
+
+    def delete(self, pos):
+        if not self.is_alive(pos):
+            return
+        if self.indexes:
+            record = self.row(pos)
+            for col_name, index in self.indexes.items():
+                index.remove(record[col_name], pos)
+        self.alive[pos] = 0
+        self.live_count -= 1
+        self._changed()
+
+    def copy(self):
+        table = Table(self.name, self.columns)
+        table.stores = {
+            col_name: store.copy() for col_name, store in self.stores.items()
+        }
+        table.alive = bytearray(self.alive)
+        table.live_count = self.live_count
+        table.indexes = copy.deepcopy(self.indexes)
+        table.stats = self.stats
+        table.stamp = self.stamp
+        table.source = self.source
+        return table
+
+    def _changed(self):
+        self.version = next(_versions)
+        if self.on_change is not None:
+            callback, self.on_change = self.on_change, None
+            callback()
+
+    def mark_changed(self):
+        # Для изменений, сделанных напрямую в буферах столбцов.
+        self._changed()
+
+    def nbytes(self):
+        return len(self.alive) + sum(
+            store.nbytes() for store in self.stores.values()
+        )
@@ -1,37 +1,418 @@
+import copy
+import csv
 import json
 import os
 
-from src.primitive_db.constants import DATA_DIR
+from src.primitive_db import metrics
+from src.primitive_db.cache import TableCache
+from src.primitive_db.constants import (
+    COMMIT_FILE,
+    DEFAULT_TABLE_FORMAT,
+    SNAPSHOT_READ_ATTEMPTS,
+    TABLE_CACHE_MAX_BYTES,
+)
+from src.primitive_db.locks import file_lock
+from src.primitive_db.schema import schema_version, table_history
+from src.primitive_db.storage import (
+    append_log,
+    compact,
+    convert_table,
+    load_table,
+    lock_path,
+    log_contains,
+    metadata_stamp,
+    remove_file_durable,
+    remove_snapshot,
+    remove_table_files,
+    replay_log,
+    table_files_stamp,
+    truncate_log,
+    write_json_atomic,
+    write_snapshot,
+)
+
+# Разобранные таблицы и метаданные живут между командами и сверяются
+# с размером и временем изменения файлов перед каждым использованием.
+table_cache = TableCache(TABLE_CACHE_MAX_BYTES)
+metadata_cache = {}
+
+# Ключи метаданных таблицы, которые меняет alter table.
+SCHEMA_KEYS = ('columns', 'schema_version', 'schema_changes', 'indexes', 'stats')
+
+
+def configure_table_cache(max_bytes):
+    table_cache.resize(max_bytes)
+
+
+def metadata_lock(filepath):
+    return file_lock(f'{filepath}.lock', exclusive=True)
+
+
+def table_lock(table_name, exclusive=False):
+    return file_lock(lock_path(table_name), exclusive)
 
 
 def load_metadata(filepath):
+    stamp = metadata_stamp(filepath)
+    cached = metadata_cache.get(filepath)
+    if cached is not None and cached[0] == stamp:
+        return copy.deepcopy(cached[1])
+
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
+            metadata = json.load(f)
     except FileNotFoundError:
+        metadata_cache.pop(filepath, None)
         return {}
 
+    # Старый формат хранил для таблицы только список столбцов.
+    for table_name, table_meta in metadata.items():
+        if isinstance(table_meta, list):
+            metadata[table_name] = {'columns': table_meta}
+
+    metadata_cache[filepath] = (stamp, metadata)
+    return copy.deepcopy(metadata)
+
 
 def save_metadata(filepath, data):
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    directory = os.path.dirname(filepath)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    write_json_atomic(filepath, data, indent=2)
+    metadata_cache[filepath] = (metadata_stamp(filepath), copy.deepcopy(data))
+
+
+def merge_metadata(base, ours, current):
+    # Переносятся только таблицы, изменённые в этом сеансе, поэтому
+    # изменения других процессов в остальных таблицах не теряются.
+    merged = dict(current)
+    for table_name in set(base) | set(ours):
+        table_meta = ours.get(table_name)
+        if table_meta == base.get(table_name):
+            continue
+        if table_meta is None:
+            merged.pop(table_name, None)
+            continue
+        table_meta = dict(table_meta)
+        current_meta = current.get(table_name) or {}
+        # Счётчик ID только растёт: его могли увеличить другие процессы.
+        next_id = current_meta.get('next_id')
+        if next_id is not None and next_id > table_meta.get('next_id', 0):
+            table_meta['next_id'] = next_id
+        # Схему мог изменить другой процесс: строки, записанные этим
+        # сеансом по старой схеме, приводятся к новой при чтении.
+        if current_meta.get('schema_version', 0) > table_meta.get(
+            'schema_version', 0
+        ):
+            for key in SCHEMA_KEYS:
+                if key in current_meta:
+                    table_meta[key] = current_meta[key]
+                else:
+                    table_meta.pop(key, None)
+        merged[table_name] = table_meta
+    return merged
+
+
+def get_index_specs(metadata, table_name):
+    return {'ID': 'primary', **metadata[table_name].get('indexes', {})}
+
+
+def get_table_format(metadata, table_name):
+    return metadata[table_name].get('format', DEFAULT_TABLE_FORMAT)
+
+
+def _table_stamp(table_name, metadata):
+    table_meta = metadata[table_name]
+    signature = json.dumps([
+        table_meta['columns'],
+        table_meta.get('indexes', {}),
+        get_table_format(metadata, table_name),
+        schema_version(metadata, table_name),
+    ])
+    return table_files_stamp(table_name), signature
+
+
+def _cache_table(table_name, metadata, table):
+    # stamp - состояние файлов, которому соответствует таблица в памяти.
+    table.stamp = _table_stamp(table_name, metadata)
+    table_cache.put(table_name, table.stamp, table, table.nbytes())
+
+
+def _read_table(table_name, metadata):
+    def read():
+        return load_table(
+            table_name,
+            metadata[table_name]['columns'],
+            get_index_specs(metadata, table_name),
+            get_table_format(metadata, table_name),
+            table_history(metadata, table_name),
+        )
+
+    # Снимок и журнал читаются без блокировки и не ждут пишущий процесс:
+    # если файлы изменились во время чтения, оно повторяется, а после
+    # нескольких неудач выполняется под разделяемой блокировкой.
+    for _ in range(SNAPSHOT_READ_ATTEMPTS):
+        stamp = _table_stamp(table_name, metadata)
+        table = read()
+        if _table_stamp(table_name, metadata) == stamp:
+            table.stamp = stamp
+            return table
+    with table_lock(table_name):
+        table = read()
+        table.stamp = _table_stamp(table_name, metadata)
+        return table
+
+
+def load_table_data(table_name, metadata):
+    table = table_cache.get(table_name, _table_stamp(table_name, metadata))
+    if table is None:
+        metrics.add('table_cache_misses')
+        table = _read_table(table_name, metadata)
+        table_cache.put(table_name, table.stamp, table, table.nbytes())
+        # stamp[0] - размеры и время изменения прочитанных файлов таблицы.
+        metrics.add('bytes_read', sum(
+            file_stamp[0] for file_stamp in table.stamp[0] if file_stamp
+        ))
+    else:
+        metrics.add('table_cache_hits')
+
+    # Статистика не влияет на данные и берётся из текущих метаданных.
+    table.stats = metadata[table_name].get('stats')
+    return table
+
+
+def allocate_ids(metadata, table_name, count=1):
+    table_meta = metadata[table_name]
+    if 'next_id' not in table_meta:
+        table = load_table_data(table_name, metadata)
+        ids = table.stores['ID']
+        max_id = max((ids.get(pos) for pos in table.positions()), default=0)
+        table_meta['next_id'] = max_id + 1
+
+    first_id = table_meta['next_id']
+    table_meta['next_id'] = first_id + count
+    return first_id
 
 
-def load_table_data(table_name):
-    os.makedirs(DATA_DIR, exist_ok=True)
-    
-    filepath = os.path.join(DATA_DIR, f'{table_name}.json')
+def save_table_data(table_name, table, metadata):
+    with table_lock(table_name, exclusive=True):
+        write_snapshot(
+            table_name,
+            table,
+            get_index_specs(metadata, table_name),
+            get_table_format(metadata, table_name),
+            schema_version(metadata, table_name),
+        )
+        truncate_log(table_name)
+        _cache_table(table_name, metadata, table)
+
+
+def append_table_log(table_name, entries, metadata, table=None, version=None):
+    if not entries:
+        return
+    # version - версия схемы, при которой построены строки. Она может быть
+    # старше версии в metadata, если другой процесс успел выполнить alter table.
+    if version is None:
+        version = schema_version(metadata, table_name)
+
+    # Журнал дописывается под исключительной блокировкой таблицы: читатели
+    # её не ждут, а другой пишущий процесс не обрежет недописанную строку.
+    with table_lock(table_name, exclusive=True):
+        # table передаётся, если изменения уже применены к таблице в памяти;
+        # иначе они применяются к закэшированной копии, если она актуальна.
+        stamp = _table_stamp(table_name, metadata)
+        if table is None:
+            table = table_cache.get(table_name, stamp)
+            if table is not None:
+                replay_log(table, entries)
+        elif table.stamp != stamp:
+            # Файлы изменил другой процесс, и в этой таблице его изменений нет.
+            table = None
+
+        should_compact = append_log(table_name, entries, version)
+        # Пока не применена прерванная транзакция, журналы не уплотняются:
+        # по ним восстановление проверяет, какие изменения уже записаны.
+        if should_compact and os.path.exists(COMMIT_FILE):
+            should_compact = False
+
+        if table is None:
+            table_cache.invalidate(table_name)
+            if should_compact:
+                rebuild_table_indexes(table_name, metadata)
+        elif should_compact:
+            save_table_data(table_name, table, metadata)
+        else:
+            _cache_table(table_name, metadata, table)
+
+
+def _commit_marker(commit_id):
+    return f'"tx": "{commit_id}"'
+
+
+def _apply_commit(commit_id, changes, metadata, tables, versions, recovery=False):
+    for table_name, entries in changes.items():
+        # Метка транзакции пишется в последнюю строку её изменений таблицы:
+        # строки дописываются одной записью, и по метке восстановление
+        # пропускает таблицы, журнал которых уже дописан.
+        if table_name not in metadata or recovery and log_contains(
+            table_name, _commit_marker(commit_id)
+        ):
+            continue
+        if commit_id:
+            entries = entries[:-1] + [{**entries[-1], 'tx': commit_id}]
+        append_table_log(
+            table_name, entries, metadata, tables.get(table_name),
+            versions.get(table_name),
+        )
+
+
+def commit_changes(metadata_file, metadata, changes, tables, versions):
+    # Сначала все изменения транзакции одним файлом пишутся во временный
+    # файл и переименовываются: после этого транзакция зафиксирована.
+    # Если запись журналов таблиц прервётся, она будет повторена для таблиц,
+    # журналы которых ещё не дописаны. Вызывается под блокировкой метаданных.
+    changes = {
+        table_name: entries
+        for table_name, entries in changes.items()
+        if entries and table_name in metadata
+    }
+    commit_id = os.urandom(8).hex()
+    os.makedirs(os.path.dirname(COMMIT_FILE), exist_ok=True)
+    write_json_atomic(COMMIT_FILE, {
+        'id': commit_id,
+        'base': load_metadata(metadata_file),
+        'metadata': metadata,
+        'changes': changes,
+        'versions': versions,
+    })
+    save_metadata(metadata_file, metadata)
+    _apply_commit(commit_id, changes, metadata, tables, versions)
+    remove_file_durable(COMMIT_FILE)
+
+
+def recover_commit(metadata_file):
+    # Вызывается под блокировкой метаданных. После сбоя другие процессы
+    # могли выдать новые ID и изменить таблицы: метаданные транзакции
+    # сливаются с текущими (счётчик ID только растёт), а журналы, уже
+    # дописанные до сбоя, повторно не применяются.
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(COMMIT_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
     except FileNotFoundError:
-        return []
+        return False
+    metadata = merge_metadata(
+        data.get('base', {}), data['metadata'], load_metadata(metadata_file)
+    )
+    save_metadata(metadata_file, metadata)
+    _apply_commit(
+        data.get('id', ''), data['changes'], metadata, {},
+        data.get('versions', {}), recovery=bool(data.get('id')),
+    )
+    remove_file_durable(COMMIT_FILE)
+    return True
+
 
+def delete_table_data(table_name):
+    with table_lock(table_name, exclusive=True):
+        table_cache.invalidate(table_name)
+        remove_table_files(table_name)
 
-def save_table_data(table_name, data):
-    os.makedirs(DATA_DIR, exist_ok=True)
-    
-    filepath = os.path.join(DATA_DIR, f'{table_name}.json')
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
 
+def rebuild_table_indexes(table_name, metadata):
+    with table_lock(table_name, exclusive=True):
+        table_cache.invalidate(table_name)
+        compact(
+            table_name,
+            metadata[table_name]['columns'],
+            get_index_specs(metadata, table_name),
+            get_table_format(metadata, table_name),
+            table_history(metadata, table_name),
+        )
+
+
+def convert_table_data(table_name, metadata, old_format):
+    with table_lock(table_name, exclusive=True):
+        convert_table(
+            table_name,
+            metadata[table_name]['columns'],
+            get_index_specs(metadata, table_name),
+            old_format,
+            get_table_format(metadata, table_name),
+            table_history(metadata, table_name),
+        )
+
+
+def remove_old_table_data(table_name, old_format):
+    with table_lock(table_name, exclusive=True):
+        table_cache.invalidate(table_name)
+        truncate_log(table_name)
+        remove_snapshot(table_name, old_format)
+
+
+def _read_csv_records(f):
+    reader = csv.DictReader(f)
+    for record in reader:
+        yield reader.line_num, record
+
+
+def _read_jsonl_records(f):
+    for line_num, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'строка {line_num}: некорректный JSON ({e.msg})')
+        if not isinstance(record, dict):
+            raise ValueError(f'строка {line_num}: ожидается объект JSON')
+        yield line_num, record
+
+
+def read_import_file(filepath, batch_size):
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension == '.csv':
+        read_records = _read_csv_records
+    elif extension in ('.jsonl', '.ndjson'):
+        read_records = _read_jsonl_records
+    else:
+        raise ValueError(f'неподдерживаемый формат файла {extension}')
+
+    # Пачки пар (номер строки в файле, запись): пустые и многострочные
+    # строки файла не сдвигают номера в сообщениях об ошибках.
+    with open(filepath, 'r', encoding='utf-8', newline='') as f:
+        batch = []
+        for numbered_record in read_records(f):
+            batch.append(numbered_record)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def export_rows(filepath, column_names, rows):
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension not in ('.csv', '.jsonl', '.ndjson'):
+        raise ValueError(f'неподдерживаемый формат файла {extension}')
+
+    count = 0
+    tmp_path = f'{filepath}.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            if extension == '.csv':
+                writer = csv.writer(f)
+                writer.writerow(column_names)
+                for row in rows:
+                    writer.writerow([row[name] for name in column_names])
+                    count += 1
+            else:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + '\n')
+                    count += 1
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        # Ошибка при вычислении строк не оставляет недописанный файл.
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
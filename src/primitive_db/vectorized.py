@@ -0,0 +1,213 @@
+import operator
+import sys
+from collections import OrderedDict
+
+from src.primitive_db.constants import (
+    VECTORIZED_MIN_ROWS,
+    VECTORIZED_STR_CACHE_BYTES,
+)
+from src.primitive_db.predicate import matches_type
+
+OPERATORS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+# NumPy загружается при первой большой таблице: его импорт заметно
+# удлиняет запуск. Без NumPy условия проверяются скомпилированными
+# предикатами.
+np = None
+_enabled = True
+
+# Строковый столбец в виде массива объектов строится за проход по таблице,
+# поэтому хранится до изменения таблицы. Массивы занимают память сверх
+# кэша таблиц, и их общий объём ограничен VECTORIZED_STR_CACHE_BYTES:
+# давно не использованные вытесняются первыми.
+_str_arrays = OrderedDict()
+_str_bytes = 0
+
+# Указатель в массиве и заголовок объекта строки.
+_STR_OVERHEAD = 8 + sys.getsizeof('')
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _load_numpy():
+    global np, _enabled
+    if _enabled and np is None:
+        try:
+            import numpy as np
+        except ImportError:
+            _enabled = False
+    return _enabled
+
+
+def configure_vectorized(enabled):
+    global _enabled
+    _enabled = enabled
+    clear_str_arrays()
+
+
+def clear_str_arrays():
+    global _str_bytes
+    _str_arrays.clear()
+    _str_bytes = 0
+
+
+def _forget_str_array(key):
+    global _str_bytes
+    entry = _str_arrays.pop(key, None)
+    if entry is not None:
+        _str_bytes -= entry[2]
+
+
+def _remember_str_array(key, version, values, size):
+    global _str_bytes
+    _forget_str_array(key)
+    if size > VECTORIZED_STR_CACHE_BYTES:
+        return
+    _str_arrays[key] = (version, values, size)
+    _str_bytes += size
+    while _str_bytes > VECTORIZED_STR_CACHE_BYTES:
+        _forget_str_array(next(iter(_str_arrays)))
+
+
+def is_enabled():
+    return _load_numpy()
+
+
+def should_vectorize(table):
+    return len(table) >= VECTORIZED_MIN_ROWS and _load_numpy()
+
+
+def _column(table, col_name):
+    # Столбцы int и bool читаются прямо из буфера таблицы, без копирования.
+    store = table.stores[col_name]
+    if store.type_name == 'int':
+        return np.frombuffer(store.values, dtype=np.int64)
+    if store.type_name == 'bool':
+        return np.frombuffer(store.values, dtype=np.bool_)
+
+    key = (table.name, col_name)
+    cached = _str_arrays.get(key)
+    if cached is not None and cached[0] == table.version:
+        _str_arrays.move_to_end(key)
+        return cached[1]
+    values = np.empty(len(store), dtype=object)
+    values[:] = [store.get(pos) for pos in range(len(store))]
+    size = len(store.buffer) + len(store) * _STR_OVERHEAD
+    _remember_str_array(key, table.version, values, size)
+    return values
+
+
+def _check_int(value):
+    # Значение вне int64 не сравнивается с массивом так же, как в Python.
+    if isinstance(value, int) and not INT64_MIN <= value <= INT64_MAX:
+        raise _Unsupported()
+
+
+def _constant(table, value):
+    return np.full(len(table.alive), value, dtype=np.bool_)
+
+
+def _compare(table, op, col_name, value):
+    col_type = dict(table.columns)[col_name]
+    if not matches_type(value, col_type):
+        # Ошибки типов для <, >, between отсеяны при компиляции предиката.
+        return _constant(table, op == '!=')
+    _check_int(value)
+    return OPERATORS[op](_column(table, col_name), value)
+
+
+def _contains(table, col_name, values):
+    col_type = dict(table.columns)[col_name]
+    matching = sorted({value for value in values if matches_type(value, col_type)})
+    if not matching:
+        return _constant(table, False)
+    column = _column(table, col_name)
+    if col_type == 'str':
+        mask = _constant(table, False)
+        for value in matching:
+            mask |= column == value
+        return mask
+    for value in matching:
+        _check_int(value)
+    return np.isin(column, np.array(matching, dtype=column.dtype))
+
+
+def _mask(table, node):
+    kind = node[0]
+    if kind == 'and':
+        return _mask(table, node[1]) & _mask(table, node[2])
+    if kind == 'or':
+        return _mask(table, node[1]) | _mask(table, node[2])
+    if kind == 'not':
+        return ~_mask(table, node[1])
+    if kind == 'cmp':
+        return _compare(table, *node[1:])
+    if kind == 'in':
+        return _contains(table, *node[1:])
+    col_name, low, high = node[1:]
+    _check_int(low)
+    _check_int(high)
+    column = _column(table, col_name)
+    return (column >= low) & (column <= high)
+
+
+def find_positions(table, where_clause):
+    # Условие вычисляется как булева маска по целым столбцам;
+    # None - если условие не удаётся вычислить так же, как в Python.
+    try:
+        mask = _mask(table, where_clause)
+    except _Unsupported:
+        return None
+    mask &= np.frombuffer(table.alive, dtype=np.bool_)
+    return np.flatnonzero(mask).tolist()
+
+
+def _assign_str(store, index, value):
+    # Значение записывается в конец буфера отдельно для каждой строки:
+    # StrColumn.set может потом перезаписать его на месте.
+    encoded = value.encode('utf-8')
+    starts, ends, buffer = store.mutable_values()
+    offsets = len(buffer) + np.arange(len(index), dtype=np.int64) * len(encoded)
+    buffer += encoded * len(index)
+    np.frombuffer(starts, dtype=np.int64)[index] = offsets
+    np.frombuffer(ends, dtype=np.int64)[index] = offsets + len(encoded)
+
+
+def update_rows(table, positions, changes):
+    # Присваивание по маске; индексированные столбцы обновляются построчно,
+    # чтобы индекс оставался согласованным. None - если путь неприменим.
+    if not should_vectorize(table) or any(
+        col_name in table.indexes for col_name in changes
+    ):
+        return None
+    for value in changes.values():
+        if isinstance(value, int):
+            try:
+                _check_int(value)
+            except _Unsupported:
+                return None
+
+    index = np.array(positions, dtype=np.intp)
+    for col_name, value in changes.items():
+        store = table.stores.get(col_name)
+        if store is None:
+            continue
+        if store.type_name == 'str':
+            _assign_str(store, index, value)
+        else:
+            dtype = np.int64 if store.type_name == 'int' else np.bool_
+            np.frombuffer(store.mutable_values(), dtype=dtype)[index] = value
+    table.mark_changed()
+    return _column(table, 'ID')[index].tolist()